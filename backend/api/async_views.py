@@ -0,0 +1,162 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial, wraps
+from threading import Event, Lock
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections, connection
+
+
+STREAM_QUEUE_SIZE = 16
+STREAM_END = object()
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor():
+    """Пул потоков для ORM, свой в каждом процессе сервера."""
+
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.ASYNC_VIEW_THREADS,
+                    thread_name_prefix='orm',
+                )
+    return _executor
+
+
+def run_view(view, request, *args, **kwargs):
+    """
+    Выполняет синхронный view в потоке пула. Соединения с базой у
+    каждого потока свои, поэтому устаревшие закрываются до и после
+    вызова так же, как это делает обработчик запроса. Обёртки
+    execute_wrapper, которые middleware положили в
+    request.execute_wrappers, ставятся на соединение потока пула.
+
+    Потоковый ответ Django 3.2 перебирает прямо в цикле событий, где ORM
+    недоступен. Если запрос пришёл через StreamingASGIHandler, ответ
+    остаётся ленивым и перебирается в потоке пула через stream_content;
+    иначе его содержимое собирается здесь же, в потоке.
+    """
+
+    close_old_connections()
+    try:
+        with ExitStack() as stack:
+            for wrapper in getattr(request, 'execute_wrappers', ()):
+                stack.enter_context(connection.execute_wrapper(wrapper))
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response = response.render()
+            elif response.streaming and not getattr(
+                request, 'async_streaming', False
+            ):
+                response.streaming_content = list(response.streaming_content)
+        return response
+    finally:
+        close_old_connections()
+
+
+async def stream_content(request, content):
+    """
+    Перебирает итератор потокового ответа в одном потоке пула и отдаёт
+    куски в цикл событий через очередь из STREAM_QUEUE_SIZE кусков: в
+    памяти не копится весь ответ, а медленный клиент притормаживает
+    чтение из базы. Если клиент отключился, поток прекращает перебор.
+    """
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(STREAM_QUEUE_SIZE)
+    stopped = Event()
+
+    def put(item):
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce():
+        close_old_connections()
+        try:
+            with ExitStack() as stack:
+                for wrapper in getattr(request, 'execute_wrappers', ()):
+                    stack.enter_context(connection.execute_wrapper(wrapper))
+                for chunk in content:
+                    if stopped.is_set():
+                        break
+                    put(chunk)
+        finally:
+            close_old_connections()
+            if not stopped.is_set():
+                put(STREAM_END)
+
+    producer = loop.run_in_executor(get_executor(), produce)
+    try:
+        while (chunk := await queue.get()) is not STREAM_END:
+            yield chunk
+    finally:
+        stopped.set()
+        while not queue.empty():
+            queue.get_nowait()
+    await producer
+
+
+def as_async_view(view):
+    """
+    Асинхронная обёртка над синхронным view DRF. Django 3.2 и DRF не
+    умеют выполнять ORM и сериализаторы асинхронно, поэтому сам view
+    вызывается в ограниченном пуле потоков, а цикл событий не
+    блокируется. Права, фильтры, пагинация и кэш остаются теми же, что и
+    у синхронных маршрутов.
+    """
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            get_executor(), partial(run_view, view, request, *args, **kwargs)
+        )
+        if response.streaming and getattr(request, 'async_streaming', False):
+            response.async_streaming_content = stream_content(
+                request, response.streaming_content
+            )
+            response.streaming_content = ()
+        return response
+
+    return async_view
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    ASGI-обработчик, который отдаёт потоковые ответы с асинхронным
+    итератором async_streaming_content: обработчик Django 3.2 умеет
+    перебирать только обычный итератор, прямо в цикле событий.
+    """
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.async_streaming = True
+        return request, error_response
+
+    async def send_response(self, response, send):
+        content = getattr(response, 'async_streaming_content', None)
+        if content is None:
+            return await super().send_response(response, send)
+
+        async def send_content(message):
+            # Содержимое уходит перед завершающим пустым сообщением.
+            if message['type'] == 'http.response.body' and not message.get(
+                'more_body'
+            ):
+                async for part in content:
+                    for chunk, _ in self.chunk_bytes(part):
+                        await send({
+                            'type': 'http.response.body',
+                            'body': chunk,
+                            'more_body': True,
+                        })
+            await send(message)
+
+        return await super().send_response(response, send_content)
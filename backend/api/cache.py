@@ -0,0 +1,251 @@
+from datetime import timedelta
+import hashlib
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from .models import CacheLock, CacheVersion
+from metrics.registry import CACHE_REQUESTS
+from recipes.transactions import on_commit_once
+
+
+RESPONSE_KEY = 'api:response:{}'
+LOCK_POLL_INTERVAL = 0.05
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def create_versions(scopes):
+    """
+    Заводит недостающие версии. Начальная версия берётся из текущего
+    времени, чтобы не совпасть с версиями до очистки базы.
+    """
+
+    CacheVersion.objects.bulk_create(
+        (
+            CacheVersion(scope=scope, version=time.time_ns())
+            for scope in scopes
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def get_versions(scopes):
+    """Возвращает {область: версия} одним запросом к базе."""
+
+    versions = dict(CacheVersion.objects.filter(
+        scope__in=scopes
+    ).values_list('scope', 'version'))
+    missing = set(scopes) - versions.keys()
+    if missing:
+        create_versions(missing)
+        versions.update(CacheVersion.objects.filter(
+            scope__in=missing
+        ).values_list('scope', 'version'))
+    return versions
+
+
+def get_version(scope):
+    return get_versions((scope,))[scope]
+
+
+def bump_version(*scopes):
+    """
+    Увеличивает версии областей атомарным UPDATE в базе, поэтому
+    одновременные смены не теряются. Если версии ещё не было, она
+    заводится и всё равно увеличивается: её мог завести читатель,
+    начавший работу до изменения.
+    """
+
+    scopes = set(scopes)
+    versions = CacheVersion.objects.filter(scope__in=scopes)
+    if versions.update(version=F('version') + 1) < len(scopes):
+        create_versions(scopes)
+        versions.update(version=F('version') + 1)
+
+
+def bump_version_on_commit(*scopes):
+    """
+    Откладывает смену версий до фиксации транзакции. Одинаковые смены
+    внутри одной транзакции (например, при массовом удалении) выполняются
+    один раз.
+    """
+
+    def bump():
+        bump_version(*scopes)
+
+    on_commit_once(('cache versions', frozenset(scopes)), lambda: bump)
+
+
+def acquire_lock(name, timeout):
+    """
+    Берёт блокировку name на timeout секунд и возвращает метку владельца
+    или None, если блокировку держит другой процесс. Захват — вставка
+    строки с уникальным именем или перехват просроченной строки одним
+    UPDATE, поэтому он атомарен при любом бэкенде кэша.
+    """
+
+    owner = uuid4().hex
+    expires = timezone.now() + timedelta(seconds=timeout)
+    try:
+        with transaction.atomic():
+            CacheLock.objects.create(name=name, owner=owner, expires=expires)
+    except IntegrityError:
+        taken = CacheLock.objects.filter(
+            name=name, expires__lt=timezone.now()
+        ).update(owner=owner, expires=expires)
+        if not taken:
+            return None
+    return owner
+
+
+def release_lock(name, owner):
+    """
+    Снимает свою блокировку и заодно удаляет просроченные блокировки
+    упавших процессов.
+    """
+
+    CacheLock.objects.filter(
+        Q(name=name, owner=owner) | Q(expires__lt=timezone.now())
+    ).delete()
+
+
+def request_fingerprint(request, scopes):
+    """Хэш версий областей кэша, хоста, пути и параметров запроса."""
+
+    # ETag и кэш ответов одного запроса читают версии один раз.
+    versions = request.__dict__.setdefault('cache_versions', {})
+    missing = [scope for scope in scopes if scope not in versions]
+    if missing:
+        versions.update(get_versions(missing))
+    versions = ':'.join(str(versions[scope]) for scope in scopes)
+    params = sorted(
+        (key, value)
+        for key in request.query_params
+        for value in request.query_params.getlist(key)
+    )
+    raw = f'{versions}:{request.get_host()}{request.path}?{params}'
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+class ConditionalGetMixin:
+    """
+    Добавляет к ответам list и retrieve сильный ETag, производный от
+    версий областей cache_scopes, и заголовок Cache-Control. На совпавший
+    If-None-Match отвечает 304 после одного запроса версий, не строя
+    ответ: аутентификация для безопасных методов откладывается до первого
+    обращения к request.user.
+    """
+
+    cache_scopes = ()
+
+    def perform_authentication(self, request):
+        if request.method not in SAFE_METHODS:
+            super().perform_authentication(request)
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_conditional_response(self, handler, request, *args, **kwargs):
+        etag = f'"{request_fingerprint(request, self.cache_scopes)}"'
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (
+            etag in parse_etags(if_none_match) or if_none_match == '*'
+        ):
+            CACHE_REQUESTS.inc('etag', 'hit')
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            CACHE_REQUESTS.inc('etag', 'miss')
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            patch_cache_control(
+                response, public=True,
+                max_age=settings.CATALOGUE_CACHE_MAX_AGE
+            )
+        return response
+
+
+class CachedResponseMixin:
+    """
+    Кэширует ответы list и retrieve для анонимных пользователей.
+
+    Ключ строится из версий областей cache_scopes, хоста, пути и
+    отсортированных параметров запроса, поэтому запись в связанные модели
+    делает старые ответы недоступными без явного удаления. Просроченную
+    запись пересчитывает только процесс, захвативший блокировку в базе
+    (см. acquire_lock), остальные в это время отдают устаревший ответ.
+    """
+
+    cache_scopes = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = request_fingerprint(request, self.cache_scopes)
+        response_key = RESPONSE_KEY.format(key)
+        lock_timeout = settings.API_CACHE_LOCK_TIMEOUT
+
+        entry = cache.get(response_key)
+        if entry is not None and entry[0] > time.time():
+            CACHE_REQUESTS.inc('response', 'hit')
+            return Response(entry[1])
+        owner = acquire_lock(key, lock_timeout)
+        if owner is None:
+            if entry is not None:
+                CACHE_REQUESTS.inc('response', 'stale')
+                return Response(entry[1])
+            deadline = time.time() + lock_timeout
+            while time.time() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                entry = cache.get(response_key)
+                if entry is not None:
+                    CACHE_REQUESTS.inc('response', 'hit')
+                    return Response(entry[1])
+
+        CACHE_REQUESTS.inc('response', 'miss')
+
+        try:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200:
+                timeout = settings.API_CACHE_TIMEOUT
+                cache.set(
+                    response_key,
+                    (time.time() + timeout, response.data),
+                    timeout * 2,
+                )
+        finally:
+            if owner is not None:
+                release_lock(key, owner)
+        return response
@@ -1,16 +1,73 @@
+from django import forms
+from django.db.models import Case, IntegerField, OuterRef, Subquery, Sum, When
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe
+from .indexes import ingredient_index, tag_index
+from recipes.models import (
+    Ingredient, IngredientsInRecipe, Recipe, RecipeToken, TagsInRecipe,
+)
+from recipes.search import tokenize
+
+
+class LookupMultipleChoiceField(forms.MultipleChoiceField):
+    """
+    Поле множественного выбора, которое переводит значения в id функцией
+    resolve по процессному индексу каталога вместо списка choices.
+    Индекс опрашивается один раз на все значения.
+    """
+
+    def __init__(self, *args, resolve, **kwargs):
+        self.resolve = resolve
+        super().__init__(*args, **kwargs)
+
+    def clean(self, value):
+        value = self.to_python(value)
+        if not value:
+            self.validate(value)
+            return value
+        ids, unknown = self.resolve(value)
+        if unknown:
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice', params={'value': unknown[0]},
+            )
+        return ids
+
+
+class LookupMultipleFilter(filters.MultipleChoiceFilter):
+    field_class = LookupMultipleChoiceField
 
 
 class RecipeFilter(filters.FilterSet):
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
-    author = filters.AllValuesFilter(field_name='author')
-    ingredients = filters.AllValuesMultipleFilter(
-        field_name='ingredients__name'
+    """
+    Слаги тегов и названия ингредиентов переводятся в id по процессным
+    индексам каталога ещё при проверке параметров, а рецепты отбираются подзапросом по таблицам
+    связей, без DISTINCT по всему списку.
+    """
+
+    tags = LookupMultipleFilter(
+        resolve=tag_index.resolve, method='get_tags'
+    )
+    author = filters.NumberFilter(field_name='author')
+    ingredients = LookupMultipleFilter(
+        resolve=ingredient_index.resolve, method='get_ingredients'
     )
     is_favorited = filters.BooleanFilter(method='get_favorited')
     is_in_shopping_cart = filters.BooleanFilter(method='get_in_shopping_cart')
+    search = filters.CharFilter(method='get_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('trending', 'trending'),), method='get_ordering'
+    )
+
+    def get_tags(self, queryset, name, data):
+        return queryset.filter(id__in=TagsInRecipe.objects.filter(
+            tag_id__in=data
+        ).values('recipe_id'))
+
+    def get_ingredients(self, queryset, name, data):
+        return queryset.filter(id__in=IngredientsInRecipe.objects.filter(
+            ingredient_id__in=data
+        ).values('recipe_id'))
 
     def get_in_shopping_cart(self, queryset, name, data):
         if data and not self.request.user.is_anonymous:
@@ -24,14 +81,45 @@ class RecipeFilter(filters.FilterSet):
             return queryset.filter(favorite_recipe__user=self.request.user)
         return queryset
 
+    def get_search(self, queryset, name, data):
+        tokens = tokenize(data)
+        if not tokens:
+            return queryset
+        matches = RecipeToken.objects.filter(token__in=tokens)
+        rank = matches.filter(recipe=OuterRef('id')).values(
+            'recipe'
+        ).annotate(total=Sum('hits')).values('total')
+        return queryset.filter(
+            id__in=matches.values('recipe_id')
+        ).annotate(
+            search_rank=Subquery(rank, output_field=IntegerField())
+        ).order_by('-search_rank', '-pub_date')
+
+    def get_ordering(self, queryset, name, data):
+        if data == 'trending':
+            return queryset.filter(trending__isnull=False).order_by(
+                '-trending__score', '-trending__recipe'
+            )
+        return queryset
+
     class Meta:
         model = Recipe
         fields = ('tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart')
+                  'is_in_shopping_cart', 'search', 'ordering')
 
 
 class IngredientFilter(filters.FilterSet):
-    name = filters.CharFilter(lookup_expr='istartswith',)
+    name = filters.CharFilter(method='get_name')
+
+    def get_name(self, queryset, name, data):
+        ids = ingredient_index.search(data)
+        if not ids:
+            return queryset.none()
+        position = Case(
+            *(When(id=pk, then=index) for index, pk in enumerate(ids)),
+            output_field=IntegerField(),
+        )
+        return queryset.filter(id__in=ids).order_by(position)
 
     class Meta:
         model = Ingredient
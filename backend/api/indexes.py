@@ -0,0 +1,478 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from fractions import Fraction
+from functools import reduce
+from itertools import groupby, islice
+from operator import itemgetter, or_
+from threading import Lock
+import time
+
+from django.conf import settings
+
+from .cache import get_version
+from recipes.journal import read_journal
+from recipes.models import Ingredient, IngredientsInRecipe, RecipeChange, Tag
+
+
+def resolve(ids_by_key, keys):
+    ids = [pk for key in keys for pk in ids_by_key.get(key, ())]
+    return ids, [key for key in keys if key not in ids_by_key]
+
+
+class CatalogueIndex:
+    """
+    Процессный индекс по таблице каталога. Строится лениво при первом
+    обращении и перестраивается, когда меняется версия каталога. Версия
+    читается из базы при каждом обращении, поэтому запись в другом
+    процессе видна сразу; за запрос к API индекс лучше спрашивать один
+    раз, через resolve.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._data = None
+
+    def __deepcopy__(self, memo):
+        # Фильтры, ссылающиеся на индекс, копируются на каждый запрос;
+        # индекс при этом остаётся общим для процесса.
+        return self
+
+    def _build(self):
+        raise NotImplementedError
+
+    def _ensure_built(self):
+        version = get_version('catalogue')
+        data = self._data
+        if data is None or data[0] != version:
+            with self._lock:
+                data = self._data
+                if data is None or data[0] != version:
+                    data = self._data = (version, *self._build())
+        return data[1:]
+
+
+class IngredientIndex(CatalogueIndex):
+    """
+    Префиксный индекс названий ингредиентов.
+
+    Хранит отсортированный список приведённых к casefold названий и
+    отвечает на запрос сначала совпадениями по префиксу, затем по
+    подстроке. Точные названия отображаются в id отдельным словарём:
+    одно название может быть у нескольких единиц измерения.
+    """
+
+    def _build(self):
+        rows = sorted(
+            (name.casefold(), pk, name)
+            for pk, name in Ingredient.objects.values_list('id', 'name')
+        )
+        by_name = {}
+        for _, pk, name in rows:
+            by_name.setdefault(name, []).append(pk)
+        return (
+            [name for name, _, _ in rows], [pk for _, pk, _ in rows], by_name
+        )
+
+    def resolve(self, names):
+        """
+        Возвращает id ингредиентов с точно такими названиями и список
+        неизвестных названий.
+        """
+
+        return resolve(self._ensure_built()[2], names)
+
+    def search(self, query, limit=None):
+        """Возвращает id ингредиентов, подходящих под запрос."""
+
+        if limit is None:
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        names, ids, _ = self._ensure_built()
+        query = query.casefold()
+        if not query:
+            return ids[:limit]
+
+        result = []
+        start = bisect_left(names, query)
+        end = start
+        while (
+            end < len(names) and len(result) < limit
+            and names[end].startswith(query)
+        ):
+            result.append(ids[end])
+            end += 1
+
+        if len(result) < limit:
+            for position, name in enumerate(names):
+                if start <= position < end or query not in name:
+                    continue
+                result.append(ids[position])
+                if len(result) == limit:
+                    break
+        return result
+
+
+ingredient_index = IngredientIndex()
+
+
+class TagIndex(CatalogueIndex):
+    """Отображение слагов тегов в id; слаги в модели не уникальны."""
+
+    def _build(self):
+        by_slug = {}
+        for slug, pk in Tag.objects.values_list('slug', 'id'):
+            by_slug.setdefault(slug, []).append(pk)
+        return (by_slug,)
+
+    def resolve(self, slugs):
+        """Возвращает id тегов с такими слагами и неизвестные слаги."""
+
+        return resolve(self._ensure_built()[0], slugs)
+
+
+tag_index = TagIndex()
+
+
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+# Длинный массив смещений перед подсчётом разворачивается в карту дольше,
+# чем идут сами операции над картами блока. Поэтому карта заводится уже с
+# 512 смещений, хотя по памяти массив выгоднее до 4096.
+ARRAY_LIMIT = 1 << 9
+
+popcount = getattr(int, 'bit_count', lambda value: bin(value).count('1'))
+
+
+def as_int(container):
+    """Контейнер блока в виде битовой карты int."""
+
+    if isinstance(container, int):
+        return container
+    bits = bytearray((CHUNK_MASK + 1) // 8)
+    for offset in container:
+        bits[offset >> 3] |= 1 << (offset & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class Bitmap:
+    """
+    Сжатое множество неотрицательных целых по схеме Roaring. Значения
+    делятся на блоки по старшим битам; редкие блоки хранятся
+    отсортированным массивом смещений, плотные — битовой картой в int.
+    """
+
+    __slots__ = ('chunks',)
+
+    def __init__(self):
+        self.chunks = {}
+
+    @classmethod
+    def from_sorted(cls, values):
+        """Строит множество из возрастающей последовательности без повторов."""
+
+        bitmap = cls()
+        start = 0
+        while start < len(values):
+            key = values[start] >> CHUNK_BITS
+            end = bisect_left(values, (key + 1) << CHUNK_BITS, start)
+            container = array(
+                'H', [value & CHUNK_MASK for value in values[start:end]]
+            )
+            bitmap.chunks[key] = (
+                container if len(container) < ARRAY_LIMIT
+                else as_int(container)
+            )
+            start = end
+        return bitmap
+
+    def add(self, value):
+        key, offset = value >> CHUNK_BITS, value & CHUNK_MASK
+        container = self.chunks.get(key)
+        if container is None:
+            self.chunks[key] = array('H', (offset,))
+        elif isinstance(container, int):
+            self.chunks[key] = container | 1 << offset
+        else:
+            position = bisect_left(container, offset)
+            if position < len(container) and container[position] == offset:
+                return
+            container.insert(position, offset)
+            if len(container) >= ARRAY_LIMIT:
+                self.chunks[key] = as_int(container)
+
+    def discard(self, value):
+        key, offset = value >> CHUNK_BITS, value & CHUNK_MASK
+        container = self.chunks.get(key)
+        if container is None:
+            return
+        if isinstance(container, int):
+            container &= ~(1 << offset)
+        else:
+            position = bisect_left(container, offset)
+            if position < len(container) and container[position] == offset:
+                del container[position]
+        if container:
+            self.chunks[key] = container
+        else:
+            del self.chunks[key]
+
+
+def pantry_rank(pair):
+    """Ключ сортировки пары (найдено, размер состава)."""
+
+    matched, size = pair
+    return -Fraction(matched, size), size - matched
+
+
+class PantryMatches:
+    """
+    Рецепты, в которых есть хотя бы один продукт из запроса, в порядке
+    убывания доли найденных ингредиентов, затем возрастания числа
+    недостающих, затем убывания id. Элементы — тройки (id рецепта, число
+    найденных ингредиентов, число ингредиентов рецепта). Поддерживает
+    count() и срезы, поэтому подходит для постраничной пагинации: срез
+    разбирает только блоки до конца страницы.
+
+    groups — пары (найдено, размер состава) в порядке ранга; пары одного
+    ранга (полностью собранные рецепты разного размера) разбираются
+    вместе, чтобы внутри ранга порядок по id был общим.
+    """
+
+    def __init__(self, chunks, total, groups):
+        self.chunks = chunks
+        self.total = total
+        self.groups = groups
+
+    def count(self):
+        return self.total
+
+    def __len__(self):
+        return self.total
+
+    def iterate(self, skip=0):
+        """
+        Элементы по порядку без первых skip. Блоки целиком пропускаются
+        по числу установленных битов, не разбирая их.
+        """
+
+        for group in self.groups:
+            for base, exact, sizes in self.chunks:
+                parts = [
+                    (matched, size, exact[matched] & sizes.get(size, 0))
+                    for matched, size in group
+                ]
+                bucket = 0
+                for _, _, bits in parts:
+                    bucket |= bits
+                if not bucket:
+                    continue
+                if skip:
+                    count = popcount(bucket)
+                    if skip >= count:
+                        skip -= count
+                        continue
+                while bucket:
+                    top = bucket.bit_length() - 1
+                    bucket ^= 1 << top
+                    if skip:
+                        skip -= 1
+                        continue
+                    matched, size = next(
+                        (matched, size) for matched, size, bits in parts
+                        if bits >> top & 1
+                    )
+                    yield base | top, matched, size
+
+    def __iter__(self):
+        return self.iterate()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('PantryMatches supports only slices')
+        start, stop, _ = index.indices(self.total)
+        return list(islice(self.iterate(start), max(stop - start, 0)))
+
+
+class PantryIndex:
+    """
+    Процессный индекс состава рецептов для подбора по имеющимся
+    продуктам. Для каждого ингредиента хранит Bitmap id рецептов с ним,
+    для каждого размера состава — Bitmap рецептов с таким числом
+    ингредиентов. Совпадения считаются побитово по блокам карт, без
+    обхода рецептов.
+
+    Индекс догоняет базу по журналу RecipeChange и перечитывает только
+    изменённые рецепты. Пропуски в id журнала — записи ещё не
+    зафиксированных транзакций — перечитываются, пока не пройдёт
+    PANTRY_JOURNAL_SETTLE секунд. Если журнал очищали, в нём отметка о
+    массовом изменении или изменений больше PANTRY_UPDATE_LIMIT, индекс
+    строится заново.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._loaded = False
+        self._last_id = 0
+        self._gaps = {}
+        self._ingredients = {}
+        self._sizes = {}
+
+    def _load(self, rows):
+        """Строит карты по парам (recipe_id, ingredient_id) по порядку id."""
+
+        by_ingredient = {}
+        by_size = {}
+        for recipe_id, group in groupby(rows, key=itemgetter(0)):
+            size = 0
+            for _, ingredient_id in group:
+                by_ingredient.setdefault(
+                    ingredient_id, array('L')
+                ).append(recipe_id)
+                size += 1
+            by_size.setdefault(size, array('L')).append(recipe_id)
+        self._ingredients = {
+            pk: Bitmap.from_sorted(ids) for pk, ids in by_ingredient.items()
+        }
+        self._sizes = {
+            size: Bitmap.from_sorted(ids) for size, ids in by_size.items()
+        }
+
+    def _update(self, recipe_ids):
+        rows = list(IngredientsInRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by().values_list('recipe_id', 'ingredient_id'))
+        for bitmap in (*self._ingredients.values(), *self._sizes.values()):
+            for recipe_id in recipe_ids:
+                bitmap.discard(recipe_id)
+        sizes = Counter()
+        for recipe_id, ingredient_id in rows:
+            self._ingredients.setdefault(ingredient_id, Bitmap()).add(
+                recipe_id
+            )
+            sizes[recipe_id] += 1
+        for recipe_id, size in sizes.items():
+            self._sizes.setdefault(size, Bitmap()).add(recipe_id)
+
+    def _rebuild(self):
+        recent = set(RecipeChange.objects.order_by('-id').values_list(
+            'id', flat=True
+        )[:settings.PANTRY_UPDATE_LIMIT])
+        now = time.monotonic()
+        self._last_id = max(recent, default=0)
+        self._gaps = {
+            pk: now for pk in range(min(recent, default=0), self._last_id)
+            if pk not in recent
+        }
+        self._load(IngredientsInRecipe.objects.order_by(
+            'recipe_id'
+        ).values_list('recipe_id', 'ingredient_id').iterator())
+        self._loaded = True
+
+    def _catch_up(self):
+        """
+        Применяет новые записи журнала. Возвращает False, если индекс
+        нужно строить заново.
+        """
+
+        limit = settings.PANTRY_UPDATE_LIMIT
+        changes, anchored = read_journal(
+            self._last_id, list(self._gaps), limit
+        )
+        if not anchored or len(changes) > limit or any(
+            recipe_id is None for _, recipe_id in changes
+        ):
+            return False
+        now = time.monotonic()
+        for pk, _ in changes:
+            self._gaps.pop(pk, None)
+            if pk > self._last_id:
+                self._gaps.update(dict.fromkeys(
+                    range(self._last_id + 1, pk), now
+                ))
+                self._last_id = pk
+        self._gaps = {
+            pk: seen for pk, seen in self._gaps.items()
+            if now - seen < settings.PANTRY_JOURNAL_SETTLE
+        }
+        if len(self._gaps) > limit:
+            return False
+        changed = {recipe_id for _, recipe_id in changes}
+        if changed:
+            self._update(changed)
+        return True
+
+    def _sync(self):
+        with self._lock:
+            if not self._loaded or not self._catch_up():
+                self._rebuild()
+
+    def match(self, ingredient_ids):
+        """
+        Возвращает PantryMatches для id имеющихся продуктов. Число
+        найденных продуктов каждого рецепта блока хранится по разрядам в
+        битовых плоскостях planes; карта продукта прибавляется к ним как
+        к двоичному счётчику, поэтому на продукт уходит в среднем две
+        операции над картой блока.
+        """
+
+        self._sync()
+        full = (1 << (CHUNK_MASK + 1)) - 1
+        with self._lock:
+            bitmaps = [
+                self._ingredients[pk] for pk in set(ingredient_ids)
+                if pk in self._ingredients
+            ]
+            depth = min(len(bitmaps), max(self._sizes, default=0))
+            keys = sorted(
+                {key for bitmap in bitmaps for key in bitmap.chunks},
+                reverse=True,
+            )
+            chunks = []
+            found = 0
+            for key in keys:
+                planes = []
+                for bitmap in bitmaps:
+                    container = bitmap.chunks.get(key)
+                    if container is None:
+                        continue
+                    carry = as_int(container)
+                    for position, plane in enumerate(planes):
+                        planes[position] = plane ^ carry
+                        carry &= plane
+                        if not carry:
+                            break
+                    else:
+                        planes.append(carry)
+                inverted = [full ^ plane for plane in planes]
+                exact = [0]
+                for matched in range(1, depth + 1):
+                    bits = 0 if matched >> len(planes) else full
+                    for position, plane in enumerate(planes):
+                        if not bits:
+                            break
+                        bits &= (
+                            plane if matched >> position & 1
+                            else inverted[position]
+                        )
+                    exact.append(bits)
+                sizes = {
+                    size: as_int(bitmap.chunks[key])
+                    for size, bitmap in self._sizes.items()
+                    if key in bitmap.chunks
+                }
+                chunks.append((key << CHUNK_BITS, exact, sizes))
+                found += popcount(reduce(or_, planes, 0))
+            pairs = sorted(
+                (
+                    (matched, size) for size in self._sizes
+                    for matched in range(1, min(size, depth) + 1)
+                ),
+                key=pantry_rank,
+            )
+        groups = [
+            list(group) for _, group in groupby(pairs, key=pantry_rank)
+        ]
+        return PantryMatches(chunks, found, groups)
+
+
+pantry_index = PantryIndex()
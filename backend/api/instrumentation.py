@@ -0,0 +1,204 @@
+from collections import Counter
+from contextlib import ExitStack
+import hashlib
+import json
+import logging
+import re
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*%s\s*,?)+\)', re.IGNORECASE)
+NUMBER_RE = re.compile(r'\b\d+\b')
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+SPACE_RE = re.compile(r'\s+')
+PHASES = ('db', 'serialize', 'render', 'view')
+
+
+def normalize_sql(sql):
+    """
+    Приводит SQL к шаблону: литералы заменяются на ?, списки IN любой
+    длины сворачиваются, чтобы одинаковые запросы с разными id совпадали.
+    """
+
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(sql.encode()).hexdigest()[:12]
+
+
+class RequestTimings:
+    """
+    Время фаз одного запроса. db копится обёрткой execute_wrapper, время
+    остальных фаз считается без запросов к базе внутри них, view — всё
+    оставшееся время обработки.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.queries = Counter()
+        self.open = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations['db'] += time.perf_counter() - started
+            template = normalize_sql(sql)
+            self.queries[template] += 1
+
+    def start(self, phase):
+        if phase not in self.open:
+            self.open[phase] = (time.perf_counter(), self.durations['db'])
+
+    def stop(self, phase):
+        if phase not in self.open:
+            return
+        started, db = self.open.pop(phase)
+        self.durations[phase] += (
+            time.perf_counter() - started - (self.durations['db'] - db)
+        )
+
+    def finish(self):
+        for phase in list(self.open):
+            self.stop(phase)
+        total = time.perf_counter() - self.started
+        self.durations['view'] = max(
+            total - sum(
+                duration for phase, duration in self.durations.items()
+                if phase != 'view'
+            ),
+            0.0,
+        )
+        return total
+
+    def repeated(self, threshold):
+        return [
+            (template, count) for template, count in self.queries.items()
+            if count >= threshold
+        ]
+
+
+class SQLInstrumentationMiddleware:
+    """
+    Замеряет число и время SQL-запросов и фазы обработки запроса.
+    Отдаёт их в заголовке Server-Timing и строкой JSON в лог, повторы
+    одного и того же SQL помечает как вероятный N+1. Включается
+    настройкой SQL_INSTRUMENTATION.
+
+    Ответы StreamingHttpResponse формируются уже после выхода из
+    middleware, поэтому их запросы в замер не попадают. В асинхронном
+    стеке обёртка передаётся асинхронным view через
+    request.execute_wrappers, а ответ рендерится ещё в пуле потоков и
+    время рендеринга входит в view.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SQL_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timings = request.timings = RequestTimings()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timings))
+            response = self.get_response(request)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = request.timings = RequestTimings()
+        request.execute_wrappers = [
+            *getattr(request, 'execute_wrappers', ()), timings
+        ]
+        response = await self.get_response(request)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        total = timings.finish()
+
+        response['Server-Timing'] = ', '.join(
+            [
+                f'{phase};dur={timings.durations[phase] * 1000:.1f}'
+                + (
+                    f';desc="{sum(timings.queries.values())} queries"'
+                    if phase == 'db' else ''
+                )
+                for phase in PHASES
+            ]
+            + [f'total;dur={total * 1000:.1f}']
+        )
+        self.log(request, response, timings, total)
+        return response
+
+    def process_template_response(self, request, response):
+        request.timings.start('render')
+        response.add_post_render_callback(
+            lambda response: request.timings.stop('render')
+        )
+        return response
+
+    def log(self, request, response, timings, total):
+        match = request.resolver_match
+        view = match.view_name if match else None
+        repeated = timings.repeated(settings.SQL_REPEATED_QUERY_THRESHOLD)
+        for template, count in repeated:
+            logger.warning(
+                'Possible N+1 in %s: %s queries with fingerprint %s: %s',
+                view or request.path, count, fingerprint(template), template
+            )
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'queries': sum(timings.queries.values()),
+            'total_ms': round(total * 1000, 1),
+            **{
+                f'{phase}_ms': round(duration * 1000, 1)
+                for phase, duration in timings.durations.items()
+            },
+            'repeated': [
+                {'fingerprint': fingerprint(template), 'count': count}
+                for template, count in repeated
+            ],
+        }))
+
+
+class SerializerTimingMixin:
+    """
+    Отмечает для SQLInstrumentationMiddleware фазу сериализации: от
+    первого обращения к контексту сериализатора до формирования ответа.
+    """
+
+    def get_serializer_context(self):
+        timings = getattr(self.request, 'timings', None)
+        if timings is not None:
+            timings.start('serialize')
+        return super().get_serializer_context()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        timings = getattr(request, 'timings', None)
+        if timings is not None:
+            timings.stop('serialize')
+        return super().finalize_response(request, response, *args, **kwargs)
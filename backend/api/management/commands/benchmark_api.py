@@ -0,0 +1,496 @@
+from datetime import timedelta
+from io import StringIO
+import json
+from math import ceil
+from statistics import median
+import sys
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from api.pagination import FeedPagination
+from api.serializers import MAX_BULK_RECIPES
+from recipes.counters import update_counter
+from recipes.feed import feed_positions
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import Follow, User
+
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADU'
+    'lEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=='
+)
+PASSWORD = 'benchmark-password'
+HEAVY_AUTHOR_RECIPES = 2000
+
+
+class Endpoint:
+    """
+    Описание замеряемого запроса. path и data могут быть функциями от
+    контекста с id тестовых объектов. user — ключ контекста с
+    пользователем, от имени которого идёт запрос. before — шаги, которые
+    выполняются перед каждым замером, after — функция от контекста и
+    ответа, которая возвращает шаг для отката изменений.
+    """
+
+    def __init__(self, name, method, path, auth=True, data=None,
+                 before=None, after=None, user='user'):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.auth = auth
+        self.user = user
+        self.data = data
+        self.before = before
+        self.after = after
+
+
+class QueryCounter:
+    """
+    Считает запросы через execute_wrapper: в отличие от
+    CaptureQueriesContext счёт не сбивается, когда сигнал request_started
+    очищает connection.queries_log.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def resolve(value, context):
+    return value(context) if callable(value) else value
+
+
+def recipe_payload(context):
+    return {
+        'name': f'Benchmark recipe {time.perf_counter_ns()}',
+        'text': 'Benchmark recipe',
+        'cooking_time': 10,
+        'image': IMAGE,
+        'tags': context['tag_ids'],
+        'ingredients': [
+            {'id': pk, 'amount': 10} for pk in context['ingredient_ids']
+        ],
+    }
+
+
+def bulk_payload(context):
+    return {'ids': context['recipe_ids']}
+
+
+def present(path):
+    """Шаги, после которых объект по адресу path точно существует."""
+
+    return (('delete', path), ('post', path))
+
+
+def absent(path):
+    return (('delete', path),)
+
+
+def get_endpoints():
+    fill_cart = (('post', '/api/recipes/shopping_cart/', bulk_payload),)
+    recipe = '/api/recipes/{recipe}/'.format_map
+    author = '/api/users/{author}/'.format_map
+    return (
+        Endpoint('users list', 'get', '/api/users/'),
+        Endpoint('user detail', 'get', author),
+        Endpoint('users me', 'get', '/api/users/me/'),
+        Endpoint(
+            'user create', 'post', '/api/users/', auth=False,
+            data=lambda context: {
+                'email': f'bench{time.perf_counter_ns()}@example.com',
+                'username': f'bench{time.perf_counter_ns()}',
+                'first_name': 'Bench', 'last_name': 'User',
+                'password': PASSWORD,
+            },
+        ),
+        Endpoint(
+            'set password', 'post', '/api/users/set_password/',
+            data={'new_password': PASSWORD, 'current_password': PASSWORD},
+        ),
+        Endpoint('subscriptions', 'get',
+                 '/api/users/subscriptions/?recipes_limit=3'),
+        Endpoint('subscriptions heavy author', 'get',
+                 '/api/users/subscriptions/?recipes_limit=3',
+                 user='heavy_reader'),
+        Endpoint(
+            'subscribe', 'post', '/api/users/{author}/subscribe/'.format_map,
+            before=absent('/api/users/{author}/subscribe/'.format_map),
+        ),
+        Endpoint(
+            'unsubscribe', 'delete',
+            '/api/users/{author}/subscribe/'.format_map,
+            before=present('/api/users/{author}/subscribe/'.format_map),
+        ),
+        Endpoint(
+            'token login', 'post', '/api/auth/token/login/', auth=False,
+            data=lambda context: {
+                'email': context['email'], 'password': PASSWORD
+            },
+        ),
+        Endpoint('tags list', 'get', '/api/tags/', auth=False),
+        Endpoint('tag detail', 'get', '/api/tags/{tag}/'.format_map,
+                 auth=False),
+        Endpoint('ingredients list', 'get', '/api/ingredients/', auth=False),
+        Endpoint('ingredients search', 'get',
+                 '/api/ingredients/?name=со', auth=False),
+        Endpoint('ingredient detail', 'get',
+                 '/api/ingredients/{ingredient}/'.format_map, auth=False),
+        Endpoint('recipes list anonymous', 'get', '/api/recipes/',
+                 auth=False),
+        Endpoint('recipes list', 'get', '/api/recipes/'),
+        Endpoint('recipes list cursor', 'get', '/api/recipes/?cursor='),
+        Endpoint('recipes list deep page', 'get',
+                 '/api/recipes/?page={last_page}'.format_map),
+        Endpoint('recipes filter tags', 'get',
+                 '/api/recipes/?tags={tag_slug}'.format_map),
+        Endpoint('recipes filter author', 'get',
+                 '/api/recipes/?author={author}'.format_map),
+        Endpoint('recipes filter ingredients', 'get',
+                 '/api/recipes/?ingredients={ingredient_name}'.format_map),
+        Endpoint('recipes filter favorited', 'get',
+                 '/api/recipes/?is_favorited=1'),
+        Endpoint('recipes filter in cart', 'get',
+                 '/api/recipes/?is_in_shopping_cart=1'),
+        Endpoint('recipes search', 'get', '/api/recipes/?search=load'),
+        Endpoint('recipes trending', 'get', '/api/recipes/?ordering=trending'),
+        Endpoint(
+            'recipes pantry', 'get', '/api/recipes/pantry/',
+            data=lambda context: {'ingredients': context['pantry']},
+        ),
+        Endpoint('recipes feed', 'get', '/api/recipes/feed/'),
+        Endpoint('recipes feed next page', 'get',
+                 '/api/recipes/feed/?cursor={feed_cursor}'.format_map),
+        Endpoint('recipe detail anonymous', 'get', recipe, auth=False),
+        Endpoint('recipe detail', 'get', recipe),
+        Endpoint(
+            'recipe create', 'post', '/api/recipes/', data=recipe_payload,
+            after=lambda context, response: (
+                'delete', f'/api/recipes/{response.json()["id"]}/'
+            ),
+        ),
+        Endpoint(
+            'recipe update', 'patch', '/api/recipes/{own_recipe}/'.format_map,
+            data=lambda context: {
+                'cooking_time': 20,
+                'tags': context['tag_ids'],
+                'ingredients': [
+                    {'id': pk, 'amount': 20}
+                    for pk in context['ingredient_ids']
+                ],
+            },
+        ),
+        Endpoint(
+            'recipe delete', 'delete', '/api/recipes/{created}/'.format_map,
+            before=(('post', '/api/recipes/', recipe_payload),),
+        ),
+        Endpoint(
+            'favorite add', 'post',
+            '/api/recipes/{recipe}/favorite/'.format_map,
+            before=absent('/api/recipes/{recipe}/favorite/'.format_map),
+        ),
+        Endpoint(
+            'favorite remove', 'delete',
+            '/api/recipes/{recipe}/favorite/'.format_map,
+            before=present('/api/recipes/{recipe}/favorite/'.format_map),
+        ),
+        Endpoint(
+            'cart add', 'post',
+            '/api/recipes/{recipe}/shopping_cart/'.format_map,
+            before=absent(
+                '/api/recipes/{recipe}/shopping_cart/'.format_map
+            ),
+        ),
+        Endpoint(
+            'cart remove', 'delete',
+            '/api/recipes/{recipe}/shopping_cart/'.format_map,
+            before=present(
+                '/api/recipes/{recipe}/shopping_cart/'.format_map
+            ),
+        ),
+        Endpoint(
+            'favorite bulk add', 'post', '/api/recipes/favorite/',
+            data=bulk_payload,
+            before=(('delete', '/api/recipes/favorite/', bulk_payload),),
+        ),
+        Endpoint(
+            'favorite bulk remove', 'delete', '/api/recipes/favorite/',
+            data=bulk_payload,
+            before=(('post', '/api/recipes/favorite/', bulk_payload),),
+        ),
+        Endpoint(
+            'cart bulk add', 'post', '/api/recipes/shopping_cart/',
+            data=bulk_payload,
+            before=(('delete', '/api/recipes/shopping_cart/', bulk_payload),),
+        ),
+        Endpoint(
+            'cart bulk remove', 'delete', '/api/recipes/shopping_cart/',
+            data=bulk_payload,
+            before=(('post', '/api/recipes/shopping_cart/', bulk_payload),),
+        ),
+        # Массовое удаление выше убирает из корзины самые популярные
+        # рецепты, поэтому выгрузка сначала возвращает их в корзину.
+        Endpoint('download shopping cart', 'get',
+                 '/api/recipes/download_shopping_cart/', before=fill_cart),
+        Endpoint('download shopping cart csv', 'get',
+                 '/api/recipes/download_shopping_cart/?format=csv',
+                 before=fill_cart),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'benchmark every api route on generated data of several sizes and '
+        'check query count and latency budgets'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=(1000,),
+            help='numbers of recipes to generate'
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='json results file')
+        parser.add_argument('--budget', help='json budget file')
+        parser.add_argument(
+            '--only', nargs='+', help='benchmark only these endpoints'
+        )
+        parser.add_argument(
+            '--cache', action='store_true',
+            help='keep the configured cache instead of a dummy one'
+        )
+
+    def seed_data(self, size, seed):
+        call_command('flush', interactive=False, verbosity=0)
+        call_command('import_ingredients', stdout=self.devnull)
+        call_command('import_tags', stdout=self.devnull)
+        users = max(size // 10, 50)
+        call_command(
+            'generate_load_data', recipes=size, users=users,
+            favorites=size * 5, carts=size, follows=users * 5, seed=seed,
+            index=True, stdout=self.devnull,
+        )
+        call_command('backfill_timelines', stdout=self.devnull)
+        call_command('refresh_trending', rebuild=True, stdout=self.devnull)
+        user = User.objects.filter(
+            username__startswith=f'load{seed}_'
+        ).order_by('id').first()
+        user.set_password(PASSWORD)
+        user.save()
+        author = User.objects.exclude(id=user.id).filter(
+            username__startswith=f'load{seed}_'
+        ).order_by('id').first()
+        heavy_reader = self.seed_heavy_author(seed)
+        recipe = Recipe.objects.order_by('-favorites_count', 'id').first()
+        tag = Tag.objects.order_by('id').first()
+        ingredients = Ingredient.objects.order_by('id')[:10]
+        used_ingredient = Ingredient.objects.filter(
+            ingredient__recipe=recipe
+        ).order_by('id').first()
+        return {
+            'user': user,
+            'heavy_reader': heavy_reader,
+            'email': user.email,
+            'author': author.id,
+            'recipe': recipe.id,
+            'own_recipe': user.recipe.order_by('id').first().id,
+            'tag': tag.id,
+            'tag_slug': tag.slug,
+            'tag_ids': [tag.id],
+            'last_page': ceil(
+                Recipe.objects.count() / settings.REST_FRAMEWORK['PAGE_SIZE']
+            ),
+            'ingredient': ingredients[0].id,
+            'ingredient_name': used_ingredient.name,
+            'pantry': list(Ingredient.objects.filter(
+                ingredient__recipe=recipe
+            ).values_list('name', flat=True)[:3]),
+            'ingredient_ids': [ingredient.id for ingredient in ingredients],
+            'feed_cursor': FeedPagination().encode_cursor(feed_positions(
+                user.id, None, settings.REST_FRAMEWORK['PAGE_SIZE']
+            )[-1]),
+            'recipe_ids': list(
+                Recipe.objects.order_by('id').values_list('id', flat=True)[
+                    :MAX_BULK_RECIPES
+                ]
+            ),
+        }
+
+    def seed_heavy_author(self, seed):
+        """
+        Автор с HEAVY_AUTHOR_RECIPES старыми рецептами и его единственный
+        подписчик: превью подписок не должны зависеть от числа рецептов
+        автора. Рецепты старше сгенерированных и не попадают в первые
+        страницы списков.
+        """
+
+        author = User.objects.create(
+            username=f'heavy{seed}', email=f'heavy{seed}@example.com'
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=author, name=f'Heavy author recipe {number}',
+                text='Heavy author recipe', cooking_time=10,
+                image='recipes/images/load.png',
+            )
+            for number in range(HEAVY_AUTHOR_RECIPES)
+        )
+        oldest = Recipe.objects.order_by('pub_date').first().pub_date
+        Recipe.objects.filter(author=author).update(
+            pub_date=oldest - timedelta(days=1)
+        )
+        update_counter(
+            User, [author.id], 'recipes_count', HEAVY_AUTHOR_RECIPES
+        )
+        reader = User.objects.create(
+            username=f'heavy{seed}_reader',
+            email=f'heavy{seed}_reader@example.com',
+        )
+        Follow.objects.create(user=reader, author=author)
+        return reader
+
+    def request(self, client, method, path, data=None):
+        response = getattr(client, method)(path, data, format='json')
+        if response.streaming:
+            payload = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            payload = len(response.content)
+        return response, payload
+
+    def run_step(self, client, step, context):
+        method, path, *data = step
+        response, _ = self.request(
+            client, method, resolve(path, context),
+            resolve(data[0], context) if data else None,
+        )
+        return response
+
+    def measure(self, endpoint, context, repeat):
+        client = APIClient(raise_request_exception=False)
+        if endpoint.auth:
+            client.force_authenticate(context[endpoint.user])
+        timings = []
+        for attempt in range(repeat + 1):
+            for step in endpoint.before or ():
+                response = self.run_step(client, step, context)
+                if step[0] == 'post' and response.status_code == 201:
+                    context['created'] = response.json().get('id')
+            path = resolve(endpoint.path, context)
+            data = resolve(endpoint.data, context)
+            if attempt == 0:
+                tracemalloc.start()
+            started = time.perf_counter()
+            queries = QueryCounter()
+            with connection.execute_wrapper(queries):
+                response, payload = self.request(
+                    client, endpoint.method, path, data
+                )
+            elapsed = time.perf_counter() - started
+            if attempt == 0:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            else:
+                timings.append(elapsed)
+            if endpoint.after:
+                self.run_step(
+                    client, endpoint.after(context, response), context
+                )
+        return {
+            'endpoint': endpoint.name,
+            'status': response.status_code,
+            'queries': queries.count,
+            'time_ms': round(median(timings) * 1000, 3),
+            'time_ms_max': round(max(timings) * 1000, 3),
+            'peak_alloc_kb': round(peak / 1024, 1),
+            'payload_bytes': payload,
+        }
+
+    def check_budget(self, results, path):
+        with open(path, encoding='utf-8') as file:
+            budget = json.load(file)
+        failures = []
+        for result in results:
+            if result['status'] >= 500:
+                failures.append(
+                    f'{result["endpoint"]} @ {result["size"]}: '
+                    f'status {result["status"]}'
+                )
+            limits = budget.get(result['endpoint'], {})
+            for metric, limit in limits.items():
+                # min_<метрика> — нижняя граница, например размера ответа.
+                if metric.startswith('min_'):
+                    metric = metric[len('min_'):]
+                    failed, sign = result[metric] < limit, '<'
+                else:
+                    failed, sign = result[metric] > limit, '>'
+                if failed:
+                    failures.append(
+                        f'{result["endpoint"]} @ {result["size"]}: '
+                        f'{metric} {result[metric]} {sign} {limit}'
+                    )
+        return failures
+
+    def benchmark(self, options):
+        endpoints = [
+            endpoint for endpoint in get_endpoints()
+            if not options['only'] or endpoint.name in options['only']
+        ]
+        results = []
+        for size in options['sizes']:
+            context = self.seed_data(size, options['seed'])
+            for endpoint in endpoints:
+                result = self.measure(endpoint, context, options['repeat'])
+                result['size'] = size
+                results.append(result)
+                self.stderr.write(
+                    f'{size:>8} {endpoint.name:<32} {result["status"]} '
+                    f'{result["queries"]:>4} queries '
+                    f'{result["time_ms"]:>9.2f} ms '
+                    f'{result["payload_bytes"]:>9} bytes'
+                )
+        return results
+
+    def handle(self, *args, **options):
+        self.devnull = StringIO()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        # Просмотры рецептов сбрасываются в рейтинг по таймеру; в замеры
+        # это попадало бы случайно.
+        overrides = {'TRENDING_VIEW_FLUSH_INTERVAL': float('inf')}
+        if not options['cache']:
+            overrides['CACHES'] = {
+                'default': {
+                    'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+                }
+            }
+        try:
+            with override_settings(**overrides):
+                results = self.benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        else:
+            json.dump(results, sys.stdout, ensure_ascii=False, indent=2)
+            sys.stdout.write('\n')
+
+        if options['budget']:
+            failures = self.check_budget(results, options['budget'])
+            if failures:
+                raise CommandError(
+                    'Budget exceeded:\n' + '\n'.join(failures)
+                )
+            self.stderr.write(self.style.SUCCESS('All budgets met'))
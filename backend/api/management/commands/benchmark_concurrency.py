@@ -0,0 +1,173 @@
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+SERVERS = {
+    'sync': ('foodgram.wsgi', 'sync', 'False'),
+    'asgi': ('foodgram.asgi:application', 'uvicorn.workers.UvicornWorker',
+             'True'),
+}
+DEFAULT_REQUESTS = (
+    'GET /api/tags/',
+    'GET /api/ingredients/?name=%D1%81%D0%BE',
+    'GET /api/recipes/',
+    'GET /api/recipes/?page=2',
+)
+START_TIMEOUT = 30
+
+
+def percentile(values, share):
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'compare throughput and tail latency of the sync gunicorn workers '
+        'and the ASGI server under concurrent load'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--servers', nargs='+', choices=SERVERS, default=tuple(SERVERS)
+        )
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument(
+            '--concurrency', type=int, default=32,
+            help='simultaneous client connections'
+        )
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--request', action='append', dest='requests',
+            help='"METHOD /path", can be repeated'
+        )
+        parser.add_argument('--token', help='auth token for the requests')
+        parser.add_argument('--output', help='json results file')
+
+    def start_server(self, name, workers, port):
+        application, worker_class, async_views = SERVERS[name]
+        process = subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn', application,
+                '--bind', f'127.0.0.1:{port}',
+                '--workers', str(workers),
+                '--worker-class', worker_class,
+                '--log-level', 'warning',
+            ],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'ASYNC_VIEWS': async_views},
+        )
+        deadline = time.monotonic() + START_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port)
+                connection.request('GET', '/api/')
+                connection.getresponse().read()
+                return process
+            except OSError:
+                time.sleep(0.2)
+        process.terminate()
+        raise CommandError(f'{name} server did not start on port {port}')
+
+    def load(self, port, requests, concurrency, duration, headers):
+        deadline = time.monotonic() + duration
+
+        def client(number):
+            connection = http.client.HTTPConnection('127.0.0.1', port)
+            latencies = []
+            statuses = {}
+            position = number
+            while time.monotonic() < deadline:
+                method, path = requests[position % len(requests)]
+                position += 1
+                started = time.perf_counter()
+                try:
+                    connection.request(method, path, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    status = response.status
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    connection = http.client.HTTPConnection(
+                        '127.0.0.1', port
+                    )
+                    status = 'error'
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+            connection.close()
+            return latencies, statuses
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(client, range(concurrency)))
+        elapsed = time.monotonic() - started
+
+        latencies = sorted(
+            latency for client_latencies, _ in results
+            for latency in client_latencies
+        )
+        statuses = {}
+        for _, client_statuses in results:
+            for status, count in client_statuses.items():
+                statuses[str(status)] = statuses.get(str(status), 0) + count
+        return {
+            'requests': len(latencies),
+            'rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'max_ms': round(latencies[-1] * 1000, 2),
+            'statuses': statuses,
+        }
+
+    def handle(self, *args, **options):
+        requests = [
+            tuple(spec.split(None, 1))
+            for spec in options['requests'] or DEFAULT_REQUESTS
+        ]
+        headers = {'Connection': 'keep-alive'}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+
+        results = []
+        for name in options['servers']:
+            process = self.start_server(
+                name, options['workers'], options['port']
+            )
+            try:
+                result = self.load(
+                    options['port'], requests, options['concurrency'],
+                    options['duration'], headers,
+                )
+            finally:
+                process.terminate()
+                process.wait()
+            result = {
+                'server': name,
+                'workers': options['workers'],
+                'concurrency': options['concurrency'],
+                **result,
+            }
+            results.append(result)
+            self.stderr.write(
+                f'{name:<5} {result["rps"]:>8} req/s  '
+                f'p50 {result["p50_ms"]:>8} ms  '
+                f'p95 {result["p95_ms"]:>8} ms  '
+                f'p99 {result["p99_ms"]:>8} ms  '
+                f'{result["statuses"]}'
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2)
+        else:
+            json.dump(results, sys.stdout, indent=2)
+            sys.stdout.write('\n')
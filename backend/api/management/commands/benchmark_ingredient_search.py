@@ -0,0 +1,128 @@
+from io import StringIO
+import json
+from statistics import median
+import sys
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from api.cache import bump_version
+from api.filters import IngredientFilter
+from api.indexes import ingredient_index
+from recipes.models import Ingredient
+
+
+DEFAULT_QUERIES = ('с', 'со', 'сол', 'мука', 'мол', 'я', 'кар', 'перец')
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        'compare the in-memory ingredient prefix index with the '
+        'istartswith query it replaced on catalogues of several sizes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=(2188, 200_000),
+            help='numbers of ingredients; the imported catalogue is padded '
+                 'with numbered copies of its names'
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--query', action='append', dest='queries',
+            help='search string, can be repeated'
+        )
+        parser.add_argument('--output', help='json results file')
+
+    def seed_data(self, size):
+        call_command('flush', interactive=False, verbosity=0)
+        call_command('import_ingredients', stdout=StringIO())
+        names = list(Ingredient.objects.order_by('id').values_list(
+            'name', 'measurement_unit'
+        ))
+        missing = size - len(names)
+        for start in range(0, max(missing, 0), BATCH_SIZE):
+            Ingredient.objects.bulk_create(
+                Ingredient(
+                    name=f'{names[number % len(names)][0]} {number}',
+                    measurement_unit=names[number % len(names)][1],
+                )
+                for number in range(start, min(start + BATCH_SIZE, missing))
+            )
+        bump_version('catalogue')
+        return Ingredient.objects.count()
+
+    def timed(self, function, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started)
+        return round(median(timings) * 1000, 3)
+
+    def measure(self, query, repeat):
+        def index():
+            return list(IngredientFilter(
+                {'name': query}, queryset=Ingredient.objects.all()
+            ).qs)
+
+        def orm():
+            return list(Ingredient.objects.filter(name__istartswith=query))
+
+        return {
+            'query': query,
+            'lookup_ms': self.timed(
+                lambda: ingredient_index.search(query), repeat
+            ),
+            'index_ms': self.timed(index, repeat),
+            'index_rows': len(index()),
+            'orm_ms': self.timed(orm, repeat),
+            'orm_rows': len(orm()),
+        }
+
+    def benchmark(self, options):
+        results = []
+        for size in options['sizes']:
+            rows = self.seed_data(size)
+            started = time.perf_counter()
+            ingredient_index.search('')
+            build_ms = round((time.perf_counter() - started) * 1000, 3)
+            self.stderr.write(f'{rows:>8} rows, index built in {build_ms} ms')
+            for query in options['queries'] or DEFAULT_QUERIES:
+                result = self.measure(query, options['repeat'])
+                result.update(size=rows, build_ms=build_ms)
+                results.append(result)
+                self.stderr.write(
+                    f'{rows:>8} {query:<8} '
+                    f'lookup {result["lookup_ms"]:>7.3f} ms '
+                    f'index {result["index_ms"]:>9.3f} ms '
+                    f'{result["index_rows"]:>6} rows  '
+                    f'istartswith {result["orm_ms"]:>9.3f} ms '
+                    f'{result["orm_rows"]:>6} rows'
+                )
+        return results
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        # Индекс сверяет версию каталога с кэшем; локальный кэш не даёт
+        # замерам зависеть от общего.
+        caches = {'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }}
+        try:
+            with override_settings(CACHES=caches):
+                results = self.benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        else:
+            json.dump(results, sys.stdout, ensure_ascii=False, indent=2)
+            sys.stdout.write('\n')
@@ -0,0 +1,148 @@
+import json
+from statistics import median
+import sys
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.pagination import Cursor
+from rest_framework.test import APIClient
+
+from api.management.commands.benchmark_api import QueryCounter
+from api.pagination import RecipeCursorPagination
+from recipes.models import Recipe
+from users.models import User
+
+
+BATCH_SIZE = 5000
+PATH = '/api/recipes/'
+
+
+class Command(BaseCommand):
+    help = (
+        'compare first and deep page latency of the recipe list in '
+        'page-number and cursor pagination modes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=(1_000_000,),
+            help='numbers of recipes to generate'
+        )
+        parser.add_argument(
+            '--pages', type=int, nargs='+', default=(1, 10_000),
+            help='page numbers to request'
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help='json results file')
+
+    def seed_data(self, size):
+        call_command('flush', interactive=False, verbosity=0)
+        author = User.objects.create(
+            username='pagination-bench', email='pagination-bench@example.com'
+        )
+        for start in range(0, size, BATCH_SIZE):
+            Recipe.objects.bulk_create(
+                Recipe(
+                    author=author, name=f'recipe {number}',
+                    text='Generated recipe', cooking_time=10,
+                    image='recipes/images/load.png',
+                )
+                for number in range(start, min(start + BATCH_SIZE, size))
+            )
+
+    def cursor_url(self, page):
+        """
+        Ссылка next, которую клиент получил бы на странице page - 1,
+        листая по курсору с первой страницы: позиция — ближайшая более
+        поздняя pub_date, смещение — число рецептов с той же pub_date,
+        что у первого рецепта страницы, на предыдущих страницах.
+        """
+
+        paginator = RecipeCursorPagination()
+        paginator.base_url = PATH
+        if page == 1:
+            return f'{PATH}?{paginator.cursor_query_param}='
+        ordered = Recipe.objects.order_by(*paginator.ordering)
+        pub_date, pk = ordered.values_list('pub_date', 'id')[
+            (page - 1) * paginator.page_size
+        ]
+        offset = Recipe.objects.filter(pub_date=pub_date, id__gt=pk).count()
+        newer = Recipe.objects.filter(pub_date__gt=pub_date).order_by(
+            'pub_date'
+        ).values_list('pub_date', flat=True).first()
+        if newer is None:
+            return paginator.encode_cursor(Cursor(offset, False, None))
+        return paginator.encode_cursor(Cursor(offset, False, str(newer)))
+
+    def measure(self, client, url, repeat):
+        timings = []
+        for _ in range(repeat):
+            queries = QueryCounter()
+            started = time.perf_counter()
+            with connection.execute_wrapper(queries):
+                response = client.get(url)
+            timings.append(time.perf_counter() - started)
+        return response, {
+            'status': response.status_code,
+            'queries': queries.count,
+            'time_ms': round(median(timings) * 1000, 3),
+        }
+
+    def benchmark(self, options):
+        client = APIClient()
+        results = []
+        for size in options['sizes']:
+            started = time.monotonic()
+            self.seed_data(size)
+            self.stderr.write(
+                f'{size:>8} recipes seeded in '
+                f'{time.monotonic() - started:.1f}s'
+            )
+            for page in options['pages']:
+                urls = {
+                    'page': f'{PATH}?page={page}',
+                    'cursor': self.cursor_url(page),
+                }
+                pages = {}
+                for mode, url in urls.items():
+                    response, result = self.measure(
+                        client, url, options['repeat']
+                    )
+                    pages[mode] = [
+                        recipe['id'] for recipe in response.json()['results']
+                    ]
+                    result.update(size=size, page=page, mode=mode)
+                    results.append(result)
+                    self.stderr.write(
+                        f'{size:>8} page {page:>6} {mode:<6} '
+                        f'{result["status"]} {result["queries"]:>3} queries '
+                        f'{result["time_ms"]:>9.2f} ms'
+                    )
+                if pages['page'] != pages['cursor']:
+                    self.stderr.write(self.style.WARNING(
+                        f'{size:>8} page {page:>6} modes returned '
+                        'different recipes'
+                    ))
+        return results
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        caches = {'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }}
+        try:
+            with override_settings(CACHES=caches):
+                results = self.benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        else:
+            json.dump(results, sys.stdout, ensure_ascii=False, indent=2)
+            sys.stdout.write('\n')
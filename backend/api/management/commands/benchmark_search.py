@@ -0,0 +1,153 @@
+from io import StringIO
+from itertools import accumulate
+import json
+import random
+import re
+from statistics import median
+import sys
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from api.management.commands.benchmark_api import QueryCounter
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+
+BATCH_SIZE = 5000
+NAME_WORDS = 3
+TEXT_WORDS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'benchmark recipe search through the token index against the '
+        'icontains scan on generated recipes with a Zipf vocabulary'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=(1_000_000,),
+            help='numbers of recipes to generate'
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='json results file')
+
+    def vocabulary(self):
+        """Слова из названий ингредиентов, от частых к редким."""
+
+        words = {}
+        for name in Ingredient.objects.values_list('name', flat=True):
+            for word in re.findall(r'\w{3,}', name.casefold()):
+                words.setdefault(word, None)
+        return list(words)
+
+    def seed_data(self, size, seed):
+        call_command('flush', interactive=False, verbosity=0)
+        call_command('import_ingredients', stdout=StringIO())
+        author = User.objects.create(
+            username='search-bench', email='search-bench@example.com'
+        )
+        words = self.vocabulary()
+        weights = list(accumulate(
+            1 / rank for rank in range(1, len(words) + 1)
+        ))
+        rng = random.Random(seed)
+
+        def phrase(length):
+            return ' '.join(rng.choices(words, cum_weights=weights, k=length))
+
+        for start in range(0, size, BATCH_SIZE):
+            Recipe.objects.bulk_create(
+                Recipe(
+                    author=author, name=f'{phrase(NAME_WORDS)} {number}',
+                    text=phrase(TEXT_WORDS), cooking_time=10,
+                    image='recipes/images/load.png',
+                )
+                for number in range(start, min(start + BATCH_SIZE, size))
+            )
+        call_command(
+            'rebuild_search_index', batch_size=BATCH_SIZE, stdout=StringIO()
+        )
+        return {
+            'common': words[0],
+            'middle': words[len(words) // 10],
+            'rare': words[-1],
+            'two words': f'{words[1]} {words[len(words) // 2]}',
+        }
+
+    def measure(self, client, query, repeat):
+        timings = []
+        for _ in range(repeat):
+            queries = QueryCounter()
+            started = time.perf_counter()
+            with connection.execute_wrapper(queries):
+                response = client.get('/api/recipes/', {'search': query})
+            timings.append(time.perf_counter() - started)
+        # Поиск по индексу находит рецепты с любым из слов запроса.
+        scan = Q()
+        for word in query.split():
+            scan |= Q(name__icontains=word) | Q(text__icontains=word)
+        scan_timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            found = Recipe.objects.filter(scan).count()
+            list(Recipe.objects.filter(scan).order_by('-pub_date')[:6])
+            scan_timings.append(time.perf_counter() - started)
+        return {
+            'status': response.status_code,
+            'queries': queries.count,
+            'count': response.json()['count'],
+            'time_ms': round(median(timings) * 1000, 3),
+            'scan_count': found,
+            'scan_ms': round(median(scan_timings) * 1000, 3),
+        }
+
+    def benchmark(self, options):
+        client = APIClient()
+        results = []
+        for size in options['sizes']:
+            started = time.monotonic()
+            queries = self.seed_data(size, options['seed'])
+            self.stderr.write(
+                f'{size:>8} recipes seeded and indexed in '
+                f'{time.monotonic() - started:.1f}s'
+            )
+            for label, query in queries.items():
+                result = self.measure(client, query, options['repeat'])
+                result.update(size=size, label=label, query=query)
+                results.append(result)
+                self.stderr.write(
+                    f'{size:>8} {label:<10} {result["status"]} '
+                    f'{result["queries"]:>3} queries '
+                    f'search {result["time_ms"]:>9.2f} ms '
+                    f'{result["count"]:>8} found  '
+                    f'icontains {result["scan_ms"]:>9.2f} ms '
+                    f'{result["scan_count"]:>8} found'
+                )
+        return results
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        caches = {'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }}
+        try:
+            with override_settings(CACHES=caches):
+                results = self.benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        else:
+            json.dump(results, sys.stdout, ensure_ascii=False, indent=2)
+            sys.stdout.write('\n')
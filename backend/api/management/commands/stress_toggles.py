@@ -0,0 +1,137 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+import os
+import random
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from rest_framework.test import APIClient
+
+from recipes.counters import COUNTERS, recount
+from recipes.models import Recipe
+from users.models import User
+
+
+ALLOWED_STATUSES = {200, 201, 204, 404}
+
+
+def toggles(recipes, authors):
+    """Запросы, которые потоки выбирают случайно, по (метод, адрес, данные)."""
+
+    for recipe in recipes:
+        for path in ('favorite', 'shopping_cart'):
+            for method in ('post', 'delete'):
+                yield method, f'/api/recipes/{recipe}/{path}/', None
+                yield method, f'/api/recipes/{path}/', {'ids': recipes}
+    for author in authors:
+        for method in ('post', 'delete'):
+            yield method, f'/api/users/{author}/subscribe/', None
+
+
+class Command(BaseCommand):
+    help = (
+        'hammer the favorite, shopping cart and subscribe toggles from '
+        'concurrent clients and fail on any server error or counter drift'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='requests per thread'
+        )
+        parser.add_argument(
+            '--users', type=int, default=4,
+            help='clients share these users to collide on the same rows'
+        )
+        parser.add_argument('--recipes', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def seed_data(self, options):
+        call_command('flush', interactive=False, verbosity=0)
+        call_command('import_ingredients', stdout=StringIO())
+        call_command('import_tags', stdout=StringIO())
+        call_command(
+            'generate_load_data', recipes=max(options['recipes'], 10),
+            users=max(options['users'] + 2, 10), favorites=0, carts=0,
+            follows=0, seed=options['seed'], stdout=StringIO(),
+        )
+        users = list(User.objects.order_by('id')[:options['users']])
+        authors = list(
+            User.objects.exclude(
+                id__in=[user.id for user in users]
+            ).order_by('id').values_list('id', flat=True)[:2]
+        )
+        recipes = list(
+            Recipe.objects.order_by('id').values_list('id', flat=True)[
+                :options['recipes']
+            ]
+        )
+        return users, list(toggles(recipes, authors))
+
+    def client(self, number, users, requests, options):
+        generator = random.Random(options['seed'] * 1000 + number)
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(users[number % len(users)])
+        statuses = Counter()
+        try:
+            for _ in range(options['requests']):
+                method, path, data = generator.choice(requests)
+                response = getattr(client, method)(path, data, format='json')
+                statuses[response.status_code] += 1
+        finally:
+            connections.close_all()
+        return statuses
+
+    def stress(self, options):
+        users, requests = self.seed_data(options)
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            results = list(executor.map(
+                lambda number: self.client(number, users, requests, options),
+                range(options['threads'])
+            ))
+        statuses = sum(results, Counter())
+        drifted = {
+            f'{model.__name__}.{field}': recount(
+                model, field, related_model, related_field,
+                model.objects.values_list('id', flat=True),
+            )
+            for model, field, related_model, related_field in COUNTERS
+        }
+        return statuses, drifted
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        test_settings = connection.settings_dict['TEST']
+        with tempfile.TemporaryDirectory() as directory:
+            if connection.vendor == 'sqlite' and not test_settings['NAME']:
+                # Общая in-memory база SQLite блокирует таблицы без
+                # ожидания, поэтому потокам нужна база в файле.
+                test_settings['NAME'] = os.path.join(directory, 'stress.db')
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                statuses, drifted = self.stress(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for code, count in sorted(statuses.items()):
+            self.stdout.write(f'{code} {count:>8}')
+        for counter, count in drifted.items():
+            self.stdout.write(f'{counter:<24} {count:>4} drifted rows')
+
+        failures = [
+            f'status {code}: {count} responses'
+            for code, count in statuses.items()
+            if code not in ALLOWED_STATUSES
+        ] + [
+            f'{counter}: {count} drifted rows'
+            for counter, count in drifted.items() if count
+        ]
+        if failures:
+            raise CommandError('; '.join(failures))
+        self.stdout.write(self.style.SUCCESS(
+            f'{sum(statuses.values())} requests, no errors'
+        ))
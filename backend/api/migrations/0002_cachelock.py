@@ -0,0 +1,30 @@
+# Generated by Django 3.2 on 2026-10-18 22:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True, verbose_name='имя')),
+                ('owner', models.CharField(max_length=32, verbose_name='владелец')),
+                ('expires', models.DateTimeField(verbose_name='истекает')),
+            ],
+            options={
+                'verbose_name': 'Блокировка кэша',
+                'verbose_name_plural': 'Блокировки кэша',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='cachelock',
+            index=models.Index(fields=['expires'], name='cache_lock_expires_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import models
+
+
+class CacheVersion(models.Model):
+    """
+    Модель версии области кэша API. Версия хранится в базе, а не в кэше:
+    её одинаково видят все процессы при любом бэкенде кэша, а смена
+    версии — один атомарный UPDATE
+    """
+
+    scope = models.CharField('область', max_length=32, unique=True)
+    version = models.PositiveBigIntegerField('версия')
+
+    class Meta:
+        verbose_name = 'Версия кэша'
+        verbose_name_plural = 'Версии кэша'
+
+    def __str__(self):
+        return f'{self.scope}: {self.version}'
+
+
+class CacheLock(models.Model):
+    """
+    Модель блокировки пересчёта записи кэша ответов. Блокировку берёт
+    тот, чья вставка прошла проверку уникальности имени, или тот, кто
+    первым перехватил просроченную; owner отличает владельца, чтобы
+    опоздавший процесс не снял чужую блокировку
+    """
+
+    name = models.CharField('имя', max_length=64, unique=True)
+    owner = models.CharField('владелец', max_length=32)
+    expires = models.DateTimeField('истекает')
+
+    class Meta:
+        verbose_name = 'Блокировка кэша'
+        verbose_name_plural = 'Блокировки кэша'
+        indexes = (
+            models.Index(fields=('expires',), name='cache_lock_expires_idx'),
+        )
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,98 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+import binascii
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination, CursorPagination, PageNumberPagination,
+)
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from recipes.feed import feed_positions
+
+
+class RecipeCursorPagination(CursorPagination):
+    ordering = ('-pub_date', '-id')
+
+
+class RecipePagination(PageNumberPagination):
+    """
+    Постраничная пагинация рецептов. При наличии параметра cursor
+    (в том числе пустого) переключается на пагинацию по курсору
+    (pub_date, id), которая не делает OFFSET и COUNT(*). Порядок в этом
+    режиме всегда хронологический.
+    """
+
+    cursor_pagination_class = RecipeCursorPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        cursor_query_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_query_param in request.query_params:
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class FeedPagination(BasePagination):
+    """
+    Курсорная пагинация ленты подписок. Курсор — позиция (pub_date, id)
+    последнего рецепта страницы; следующая страница читается из ленты
+    по индексу от этой позиции, без OFFSET и COUNT(*). Листается только
+    вперёд.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = CursorPagination.invalid_cursor_message
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, pk = urlsafe_b64decode(
+                encoded.encode('ascii')
+            ).decode('ascii').split(' ')
+            pub_date = parse_datetime(pub_date)
+            if pub_date is None:
+                raise ValueError
+            return pub_date, int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        pub_date, pk = position
+        return urlsafe_b64encode(
+            f'{pub_date.isoformat()} {pk}'.encode('ascii')
+        ).decode('ascii')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        positions = feed_positions(
+            request.user.id, self.decode_cursor(request), self.page_size + 1
+        )
+        page = positions[:self.page_size]
+        self.next_position = page[-1] if len(positions) > len(page) else None
+        recipes = queryset.in_bulk([pk for _, pk in page])
+        return [recipes[pk] for _, pk in page if pk in recipes]
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            self.encode_cursor(self.next_position),
+        )
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
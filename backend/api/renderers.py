@@ -0,0 +1,109 @@
+import csv
+import json
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Базовый рендерер списка покупок. Сам список отдаёт генератором через
+    stream, обычные ответы (например, OPTIONS) рендерит построчно; ошибки
+    выгрузки рендерит JSONRenderer.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return str(data).encode(self.charset)
+
+    def stream(self, user, shopping_list):
+        raise NotImplementedError
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, user, shopping_list):
+        yield f"{user.username}'s shopping list\n\n"
+        for ingredient in shopping_list:
+            yield (
+                f'{ingredient["ingredient__name"]} - '
+                f'{ingredient["ingredient_total"]}'
+                f'{ingredient["ingredient__measurement_unit"]}\n'
+            )
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, user, shopping_list):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'amount', 'measurement_unit'))
+        for ingredient in shopping_list:
+            yield writer.writerow((
+                ingredient['ingredient__name'],
+                ingredient['ingredient_total'],
+                ingredient['ingredient__measurement_unit'],
+            ))
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+    def stream(self, user, shopping_list):
+        yield '{"user": %s, "ingredients": [' % json.dumps(
+            user.username, ensure_ascii=False
+        )
+        separator = ''
+        for ingredient in shopping_list:
+            yield separator + json.dumps({
+                'name': ingredient['ingredient__name'],
+                'amount': ingredient['ingredient_total'],
+                'measurement_unit': ingredient['ingredient__measurement_unit'],
+            }, ensure_ascii=False)
+            separator = ', '
+        yield ']}'
+
+
+SHOPPING_LIST_RENDERERS = (
+    ShoppingListTextRenderer,
+    ShoppingListCSVRenderer,
+    ShoppingListJSONRenderer,
+)
+
+
+class ShoppingListNegotiation(DefaultContentNegotiation):
+    """Неизвестный format списка покупок — ошибка запроса, а не 404."""
+
+    def filter_renderers(self, renderers, format):
+        renderers = [
+            renderer for renderer in renderers if renderer.format == format
+        ]
+        if not renderers:
+            raise ValidationError({'format': [
+                f'Unsupported format "{format}", use one of: ' + ', '.join(
+                    renderer.format for renderer in SHOPPING_LIST_RENDERERS
+                )
+            ]})
+        return renderers
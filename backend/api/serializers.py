@@ -1,17 +1,22 @@
 import base64
+from collections.abc import Mapping
 
 from django.core.files.base import ContentFile
+from django.db.models import Prefetch, prefetch_related_objects
 from django.db.transaction import atomic
-from rest_framework import serializers, status
-from rest_framework.exceptions import ValidationError
+from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from .indexes import ingredient_index
 from recipes.models import Ingredient, IngredientsInRecipe, Recipe, Tag
+from recipes.tasks import process_recipe_image
 from users.models import Follow, User
 
 
 MIN_VALUE = 1
 MAX_VALUE = 32_000
+MAX_BULK_RECIPES = 100
+MAX_PANTRY_INGREDIENTS = 30
 
 
 class UserCreateSerializer(serializers.ModelSerializer):
@@ -33,14 +38,22 @@ class UserCreateSerializer(serializers.ModelSerializer):
         return value
 
 
-class UserSerializer(serializers.ModelSerializer):
-    is_subscribed = serializers.SerializerMethodField()
+class SubscribedMixin:
+    """is_subscribed по id авторов, загруженным один раз на контекст."""
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
-        return obj.following.filter(user=request.user).exists()
+        if 'followed_ids' not in self.context:
+            self.context['followed_ids'] = set(
+                request.user.follower.values_list('author_id', flat=True)
+            )
+        return obj.id in self.context['followed_ids']
+
+
+class UserSerializer(SubscribedMixin, serializers.ModelSerializer):
+    is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -48,7 +61,9 @@ class UserSerializer(serializers.ModelSerializer):
                   'is_subscribed')
 
 
-class FollowRepresentationSerializer(serializers.ModelSerializer):
+class FollowRepresentationSerializer(
+    SubscribedMixin, serializers.ModelSerializer
+):
     email = serializers.ReadOnlyField()
     id = serializers.ReadOnlyField()
     username = serializers.ReadOnlyField()
@@ -56,7 +71,7 @@ class FollowRepresentationSerializer(serializers.ModelSerializer):
     last_name = serializers.ReadOnlyField()
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -65,20 +80,16 @@ class FollowRepresentationSerializer(serializers.ModelSerializer):
             'is_subscribed', 'recipes', 'recipes_count'
         )
 
-    def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return obj.follower.exists()
-
     def get_recipes(self, obj):
-        queryset = obj.recipe.all()
+        queryset = getattr(obj, 'recipe_previews', None)
+        if queryset is None:
+            queryset = obj.recipe.all()
+            limit = self.context.get('recipes_limit')
+            if limit is not None:
+                queryset = queryset[:limit]
         serializer = RecipeInfoSerializer(queryset, many=True)
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        return obj.recipe.count()
-
 
 class FollowSerializer(serializers.ModelSerializer):
 
@@ -87,30 +98,10 @@ class FollowSerializer(serializers.ModelSerializer):
         fields = ('user', 'author')
 
     def to_representation(self, instance):
-        request = self.context.get('request')
         return FollowRepresentationSerializer(
-            instance.author, context={'request': request}
+            instance.author, context=self.context
         ).data
 
-    def create(self, validated_data):
-        user = self.context['request'].user
-        author = validated_data['author']
-
-        if user.follower.filter(author=author).exists():
-            raise ValidationError(
-                'Already subscribed',
-                code=status.HTTP_400_BAD_REQUEST
-            )
-
-        if user == author:
-            raise ValidationError(
-                'Unable to subscribe to yourself',
-                code=status.HTTP_400_BAD_REQUEST
-            )
-
-        follow = Follow.objects.create(user=user, author=author)
-        return follow
-
 
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
@@ -142,8 +133,40 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         )
 
 
+class InBulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Берёт объект из context['in_bulk'][модель], если он загружен."""
+
+    def to_internal_value(self, data):
+        model = self.get_queryset().model
+        objects = self.context.get('in_bulk', {}).get(model)
+        if objects is None:
+            return super().to_internal_value(data)
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            pk = model._meta.pk.get_prep_value(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in objects:
+            self.fail('does_not_exist', pk_value=data)
+        return objects[pk]
+
+
+def prepared_pks(model, values):
+    """Приводит id к типу первичного ключа, пропуская некорректные."""
+
+    pks = set()
+    for value in values:
+        try:
+            if not isinstance(value, bool):
+                pks.add(model._meta.pk.get_prep_value(value))
+        except (TypeError, ValueError):
+            pass
+    return pks
+
+
 class AddIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = InBulkPrimaryKeyRelatedField(queryset=Ingredient.objects.all())
     amount = serializers.IntegerField(
         min_value=MIN_VALUE, max_value=MAX_VALUE
     )
@@ -165,7 +188,7 @@ class Base64ImageField(serializers.ImageField):
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     ingredients = AddIngredientSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = InBulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(), many=True
     )
     image = Base64ImageField()
@@ -181,6 +204,25 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('author',)
 
+    def to_internal_value(self, data):
+        """Загружает упомянутые ингредиенты и теги двумя запросами."""
+
+        if isinstance(data, Mapping):
+            in_bulk = {}
+            ingredients = data.get('ingredients')
+            if isinstance(ingredients, list):
+                in_bulk[Ingredient] = Ingredient.objects.in_bulk(
+                    prepared_pks(Ingredient, (
+                        item.get('id') for item in ingredients
+                        if isinstance(item, Mapping)
+                    ))
+                )
+            tags = data.get('tags')
+            if isinstance(tags, list):
+                in_bulk[Tag] = Tag.objects.in_bulk(prepared_pks(Tag, tags))
+            self.context['in_bulk'] = in_bulk
+        return super().to_internal_value(data)
+
     def validate(self, data):
         ingredients = data['ingredients']
         unique_ingredients = set()
@@ -212,22 +254,69 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         recipe = super().create(validated_data)
         recipe.tags.set(tags)
         self.add_ingredients(ingredients, recipe)
+        process_recipe_image.enqueue(recipe_id=recipe.id)
         return recipe
 
+    def update_ingredients(self, ingredients, recipe):
+        """Пишет только разницу между новым и текущим составом."""
+
+        current = {
+            row.ingredient_id: row
+            for row in IngredientsInRecipe.objects.filter(recipe=recipe)
+        }
+        amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        created = [
+            IngredientsInRecipe(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        ]
+        changed = []
+        for ingredient_id, row in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        removed = [
+            row.id for ingredient_id, row in current.items()
+            if ingredient_id not in amounts
+        ]
+
+        if removed:
+            IngredientsInRecipe.objects.filter(id__in=removed).delete()
+        if changed:
+            IngredientsInRecipe.objects.bulk_update(changed, ('amount',))
+        if created:
+            IngredientsInRecipe.objects.bulk_create(created)
+
     @atomic
     def update(self, obj, validated_data):
         if 'ingredients' in validated_data:
-            ingredients = validated_data.pop('ingredients')
-            obj.ingredients.clear()
-            self.add_ingredients(ingredients, obj)
+            self.update_ingredients(validated_data.pop('ingredients'), obj)
 
         if 'tags' in validated_data:
             tags = validated_data.pop('tags')
             obj.tags.set(tags)
 
+        if 'image' in validated_data:
+            process_recipe_image.enqueue(recipe_id=obj.id)
         return super().update(obj, validated_data)
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            (instance,),
+            'tags',
+            Prefetch(
+                'recipe',
+                queryset=IngredientsInRecipe.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
         serializer = RecipeSerializer(instance, context=self.context)
         return serializer.data
 
@@ -257,6 +346,30 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=MIN_VALUE),
+        allow_empty=False, max_length=MAX_BULK_RECIPES,
+    )
+
+
+class PantrySerializer(serializers.Serializer):
+    """Названия имеющихся продуктов; в validated_data — их id."""
+
+    ingredients = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False, max_length=MAX_PANTRY_INGREDIENTS,
+    )
+
+    def validate_ingredients(self, value):
+        ids, unknown = ingredient_index.resolve(list(dict.fromkeys(value)))
+        if unknown:
+            raise serializers.ValidationError(
+                f'Unknown ingredients: {", ".join(unknown)}'
+            )
+        return ids
+
+
 class RecipeInfoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
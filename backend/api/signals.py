@@ -0,0 +1,43 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_version_on_commit
+from recipes.journal import journal_recipes
+from recipes.models import (
+    Ingredient, IngredientsInRecipe, Recipe, Tag, TagsInRecipe,
+)
+from users.models import User
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_catalogue_cache(sender, **kwargs):
+    bump_version_on_commit('catalogue', 'recipes')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientsInRecipe)
+@receiver((post_save, post_delete), sender=TagsInRecipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_recipes_cache(sender, **kwargs):
+    bump_version_on_commit('recipes')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def journal_recipe(sender, instance, update_fields=None, **kwargs):
+    # Замена изображения не меняет состав рецепта.
+    if not update_fields or not set(update_fields) <= {'image'}:
+        journal_recipes((instance.id,))
+
+
+@receiver((post_save, post_delete), sender=IngredientsInRecipe)
+def journal_recipe_ingredient(sender, instance, **kwargs):
+    journal_recipes((instance.recipe_id,))
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_authors_cache(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    bump_version_on_commit('recipes')
@@ -0,0 +1,319 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+from django.db import connection, connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APITestCase
+
+from recipes.models import (
+    FavoriteRecipe, Ingredient, IngredientsInRecipe, Recipe, ShoppingList, Tag,
+)
+from users.models import Follow, User
+
+
+DUMMY_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+
+def create_users(count, prefix='user'):
+    User.objects.bulk_create(
+        User(
+            username=f'{prefix}{number}',
+            email=f'{prefix}{number}@example.com',
+            first_name='Test', last_name=f'User {number}', password='!',
+        )
+        for number in range(count)
+    )
+    return list(User.objects.filter(username__startswith=prefix))
+
+
+def create_recipes(author, count, tag, ingredients, prefix='recipe'):
+    Recipe.objects.bulk_create(
+        Recipe(
+            author=author, name=f'{prefix} {author.id} {number}',
+            text='Test recipe', cooking_time=10,
+            image='recipes/images/test.png',
+        )
+        for number in range(count)
+    )
+    recipes = list(Recipe.objects.filter(
+        author=author, name__startswith=f'{prefix} {author.id} '
+    ))
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe=recipe, tag=tag) for recipe in recipes
+    )
+    IngredientsInRecipe.objects.bulk_create(
+        IngredientsInRecipe(recipe=recipe, ingredient=ingredient, amount=10)
+        for recipe in recipes
+        for ingredient in ingredients
+    )
+    return recipes
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class QueryCountTests(APITestCase):
+    """
+    Число запросов к спискам не зависит от числа строк на странице и от
+    объёма данных.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast'
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(3)
+        )
+        cls.ingredients = list(Ingredient.objects.all())
+
+    def seed(self, authors, recipes_per_author):
+        authors = create_users(
+            authors, prefix=f'author{User.objects.count()}_'
+        )
+        for author in authors:
+            create_recipes(
+                author, recipes_per_author, self.tag, self.ingredients
+            )
+        Follow.objects.bulk_create(
+            Follow(user=self.user, author=author) for author in authors
+        )
+
+    def assert_queries(self, path, counts):
+        """
+        Запрашивает path, добавляя данные между замерами: counts — пары
+        (авторов, рецептов у каждого) и ожидаемое число запросов.
+        """
+
+        self.client.force_authenticate(self.user)
+        for (authors, recipes_per_author), queries in counts:
+            self.seed(authors, recipes_per_author)
+            with self.assertNumQueries(queries):
+                response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+
+    def test_users_list(self):
+        self.assert_queries('/api/users/', (((2, 1), 3), ((20, 1), 3)))
+
+    def test_recipes_list(self):
+        self.assert_queries('/api/recipes/', (((1, 2), 5), ((5, 10), 5)))
+
+    def test_subscriptions(self):
+        self.assert_queries(
+            '/api/users/subscriptions/?recipes_limit=3',
+            (((1, 1), 4), ((6, 20), 4)),
+        )
+
+    def test_subscriptions_without_limit(self):
+        self.assert_queries(
+            '/api/users/subscriptions/', (((1, 1), 4), ((6, 20), 4))
+        )
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class RecipeIngredientsUpdateTests(APITestCase):
+    """PATCH рецепта пишет только изменившиеся строки состава."""
+
+    table = IngredientsInRecipe._meta.db_table
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@example.com'
+        )
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast'
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(4)
+        )
+        cls.ingredients = list(Ingredient.objects.order_by('id'))
+        cls.recipe = create_recipes(
+            cls.author, 1, cls.tag, cls.ingredients[:3]
+        )[0]
+
+    def setUp(self):
+        self.client.force_authenticate(self.author)
+
+    def patch(self, amounts):
+        """
+        Отправляет состав {ингредиент: количество} и возвращает запросы
+        записи в таблицу состава.
+        """
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/',
+                {
+                    'tags': [self.tag.id],
+                    'ingredients': [
+                        {'id': ingredient.id, 'amount': amount}
+                        for ingredient, amount in amounts.items()
+                    ],
+                },
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        return [
+            query['sql'].split(None, 1)[0].upper()
+            for query in queries.captured_queries
+            if self.table in query['sql']
+            and query['sql'].lstrip().upper().startswith(
+                ('INSERT', 'UPDATE', 'DELETE')
+            )
+        ]
+
+    def test_unchanged_ingredients_are_not_written(self):
+        amounts = dict.fromkeys(self.ingredients[:3], 10)
+        self.assertEqual(self.patch(amounts), [])
+
+    def test_amount_change_is_one_update(self):
+        amounts = dict.fromkeys(self.ingredients[:3], 10)
+        amounts[self.ingredients[0]] = 25
+        self.assertEqual(self.patch(amounts), ['UPDATE'])
+        self.assertEqual(
+            IngredientsInRecipe.objects.get(
+                recipe=self.recipe, ingredient=self.ingredients[0]
+            ).amount,
+            25,
+        )
+
+    def test_swap_is_one_delete_and_one_insert(self):
+        amounts = dict.fromkeys(
+            (*self.ingredients[:2], self.ingredients[3]), 10
+        )
+        self.assertEqual(sorted(self.patch(amounts)), ['DELETE', 'INSERT'])
+        self.assertEqual(
+            set(IngredientsInRecipe.objects.filter(
+                recipe=self.recipe
+            ).values_list('ingredient', flat=True)),
+            {ingredient.id for ingredient in amounts},
+        )
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class ShoppingListDownloadTests(APITestCase):
+    """Ошибки выгрузки списка покупок отдаются в JSON."""
+
+    url = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='buyer', email='buyer@example.com'
+        )
+
+    def test_unsupported_format_is_bad_request(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.url, {'format': 'pdf'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('format', response.json())
+
+    def test_anonymous_error_is_json(self):
+        response = self.client.get(self.url, {'format': 'csv'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_supported_format(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.url, {'format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class ToggleConsistencyTests(TransactionTestCase):
+    """
+    Повторные и одновременные переключения избранного и корзины не дают
+    ошибок сервера, а счётчики рецепта совпадают с числом строк.
+    Счётчики меняются при фиксации транзакции, поэтому тесты идут на
+    настоящих транзакциях.
+    """
+
+    client_class = APIClient
+    threads = 8
+    counters = (
+        ('favorite', 'favorites_count', FavoriteRecipe),
+        ('shopping_cart', 'in_carts_count', ShoppingList),
+    )
+
+    def setUp(self):
+        self.users = create_users(4)
+        tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast'
+        )
+        ingredient = Ingredient.objects.create(
+            name='ингредиент', measurement_unit='г'
+        )
+        self.recipe = create_recipes(
+            self.users[0], 1, tag, (ingredient,)
+        )[0]
+
+    def assert_counters(self, expected):
+        self.recipe.refresh_from_db()
+        for _, field, model in self.counters:
+            self.assertEqual(getattr(self.recipe, field), expected)
+            self.assertEqual(
+                model.objects.filter(recipe=self.recipe).count(), expected
+            )
+
+    def test_duplicate_toggles(self):
+        self.client.force_authenticate(self.users[1])
+        for path, _, _ in self.counters:
+            url = f'/api/recipes/{self.recipe.id}/{path}/'
+            self.assertEqual(self.client.post(url).status_code, 201)
+            self.assertEqual(self.client.post(url).status_code, 200)
+        self.assert_counters(1)
+        for path, _, _ in self.counters:
+            url = f'/api/recipes/{self.recipe.id}/{path}/'
+            self.assertEqual(self.client.delete(url).status_code, 204)
+            self.assertEqual(self.client.delete(url).status_code, 404)
+        self.assert_counters(0)
+
+    def toggle_concurrently(self, method):
+        """
+        Каждый поток от имени одного из пользователей одновременно с
+        остальными шлёт method на избранное и корзину рецепта.
+        """
+
+        barrier = Barrier(self.threads)
+
+        def toggle(number):
+            client = APIClient(raise_request_exception=False)
+            client.force_authenticate(self.users[number % len(self.users)])
+            barrier.wait()
+            try:
+                return Counter(
+                    getattr(client, method)(
+                        f'/api/recipes/{self.recipe.id}/{path}/'
+                    ).status_code
+                    for path, _, _ in self.counters
+                )
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            return sum(executor.map(toggle, range(self.threads)), Counter())
+
+    def test_concurrent_toggles(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('shared in-memory SQLite locks tables on write')
+        created = len(self.users) * len(self.counters)
+        repeated = self.threads * len(self.counters) - created
+        self.assertEqual(
+            self.toggle_concurrently('post'), {201: created, 200: repeated}
+        )
+        self.assert_counters(len(self.users))
+        self.assertEqual(
+            self.toggle_concurrently('delete'), {204: created, 404: repeated}
+        )
+        self.assert_counters(0)
@@ -0,0 +1,25 @@
+from django.urls import URLPattern, include, path
+
+from .async_views import as_async_view
+from .urls import app_name, router  # noqa
+
+
+ASYNC_ROUTES = (
+    'tags-list', 'tags-detail',
+    'ingredients-list', 'ingredients-detail',
+    'recipes-list', 'recipes-detail',
+    'recipes-favorite', 'recipes-shopping-cart',
+    'recipes-favorite-bulk', 'recipes-shopping-cart-bulk', 'recipes-feed',
+    'recipes-pantry', 'recipes-download-shopping-cart',
+)
+
+urlpatterns = [
+    path('', include([
+        URLPattern(
+            pattern.pattern, as_async_view(pattern.callback),
+            pattern.default_args, pattern.name
+        ) if pattern.name in ASYNC_ROUTES else pattern
+        for pattern in router.urls
+    ])),
+    path('auth/', include('djoser.urls.authtoken'))
+]
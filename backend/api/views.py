@@ -1,32 +1,44 @@
-from django.db.models import Sum
+from django.db.models import Prefetch, Sum, prefetch_related_objects
 from django.db.models.expressions import Exists, OuterRef
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.serializers import SetPasswordSerializer
 from djoser.views import UserViewSet as DjoserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import (
     SAFE_METHODS, IsAuthenticated, IsAuthenticatedOrReadOnly,
 )
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from .cache import CachedResponseMixin, ConditionalGetMixin
 from .filters import IngredientFilter, RecipeFilter
+from .indexes import pantry_index
+from .instrumentation import SerializerTimingMixin
+from .pagination import FeedPagination, RecipePagination
 from .permissions import IsAdminOrReadOnly, IsOwnerOrReadOnly
+from .renderers import SHOPPING_LIST_RENDERERS, ShoppingListNegotiation
 from .serializers import (
-    FollowSerializer, IngredientSerializer, RecipeCreateSerializer,
+    FollowRepresentationSerializer, FollowSerializer, IngredientSerializer,
+    PantrySerializer, RecipeCreateSerializer, RecipeIdsSerializer,
     RecipeInfoSerializer, RecipeSerializer, TagSerializer,
-    UserCreateSerializer, UserSerializer,
+    UserCreateSerializer, UserSerializer, prepared_pks,
 )
+from recipes.feed import clear_timeline, latest_recipes
+from recipes.links import add_links, remove_links
 from recipes.models import (
     FavoriteRecipe, Ingredient, IngredientsInRecipe, Recipe, ShoppingList, Tag,
 )
+from recipes.tasks import delete_recipe_image, fill_timeline
+from recipes.trending import record_view
 from users.models import Follow, User
 
 
-class UserViewSet(DjoserViewSet):
+class UserViewSet(SerializerTimingMixin, DjoserViewSet):
     queryset = User.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = PageNumberPagination
@@ -52,18 +64,37 @@ class UserViewSet(DjoserViewSet):
         )
         serializer.is_valid(raise_exception=True)
         self.request.user.set_password(serializer.data['new_password'])
-        self.request.user.save()
-        return Response(
-            {'message': 'Password changed successfully'},
-            status=status.HTTP_204_NO_CONTENT
-        )
+        self.request.user.save(update_fields=('password',))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def get_recipes_limit(self):
+        try:
+            limit = int(self.request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            return None
+        return max(limit, 0)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['recipes_limit'] = self.get_recipes_limit()
+        return context
 
     @action(('GET',), detail=False, permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
-        queryset = request.user.follower.all()
-        page = self.paginate_queryset(queryset)
+        page = self.paginate_queryset(
+            request.user.follower.select_related('author')
+        )
+        recipes = Recipe.objects.all()
+        limit = self.get_recipes_limit()
+        if limit is not None:
+            recipes = latest_recipes(
+                [follow.author_id for follow in page], limit
+            )
+        prefetch_related_objects(page, Prefetch(
+            'author__recipe', queryset=recipes, to_attr='recipe_previews'
+        ))
         serializer = FollowSerializer(
-            page, many=True, context={'request': request}
+            page, many=True, context=self.get_serializer_context()
         )
         return self.get_paginated_response(serializer.data)
 
@@ -71,22 +102,33 @@ class UserViewSet(DjoserViewSet):
         ('POST', 'DELETE'), detail=True, permission_classes=(IsAuthenticated,)
     )
     def subscribe(self, request, id):
-        author = get_object_or_404(User, id=id)
         user = request.user
-        if request.method == 'POST':
-            serializer = FollowSerializer(
-                data={'user': user.id, 'author': author.id},
-                context={'request': request}
-            )
-            serializer.is_valid()
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
-            get_object_or_404(Follow, user=user, author=author).delete()
+            removed = remove_links(Follow, user.id, prepared_pks(User, (id,)))
+            if not removed:
+                raise NotFound
+            clear_timeline(user.id, removed.pop())
             return Response(status=status.HTTP_204_NO_CONTENT)
+        author = get_object_or_404(User, id=id)
+        if author == user:
+            raise ValidationError('Unable to subscribe to yourself')
+        created = add_links(Follow, user.id, (author.id,))
+        if created:
+            fill_timeline.enqueue(user_id=user.id, author_id=author.id)
+        serializer = FollowRepresentationSerializer(
+            author, context=self.get_serializer_context()
+        )
+        return Response(
+            serializer.data,
+            status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(
+    SerializerTimingMixin, ConditionalGetMixin, CachedResponseMixin,
+    viewsets.ModelViewSet
+):
+    cache_scopes = ('catalogue',)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAdminOrReadOnly,)
@@ -95,19 +137,31 @@ class IngredientViewSet(viewsets.ModelViewSet):
     filterset_class = IngredientFilter
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(
+    SerializerTimingMixin, ConditionalGetMixin, CachedResponseMixin,
+    viewsets.ModelViewSet
+):
+    cache_scopes = ('catalogue',)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAdminOrReadOnly,)
     pagination_class = None
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    SerializerTimingMixin, CachedResponseMixin, viewsets.ModelViewSet
+):
+    cache_scopes = ('recipes',)
     queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend,)
     permission_classes = (IsOwnerOrReadOnly,)
+    pagination_class = RecipePagination
     filterset_class = RecipeFilter
 
+    def retrieve(self, request, *args, **kwargs):
+        record_view(kwargs.get('pk'))
+        return super().retrieve(request, *args, **kwargs)
+
     def destroy(self, request, pk=None):
         instance = get_object_or_404(Recipe, id=pk)
         if not instance.author == request.user:
@@ -117,8 +171,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = Recipe.objects.select_related('author').prefetch_related(
-            'tags', 'ingredients', 'recipe', 'in_shopping_list',
-            'favorite_recipe',
+            'tags',
+            Prefetch(
+                'recipe',
+                queryset=IngredientsInRecipe.objects.select_related(
+                    'ingredient'
+                ),
+            ),
         )
         if self.request.user.is_authenticated:
             queryset = queryset.annotate(
@@ -141,76 +200,142 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        image = instance.image.name
+        instance.delete()
+        if image:
+            delete_recipe_image.enqueue(name=image)
+
+    def handle_exception(self, exc):
+        if self.action == 'download_shopping_cart':
+            # Ошибки выгрузки отдаются в JSON, а не в формате списка.
+            self.request.accepted_renderer = JSONRenderer()
+            self.request.accepted_media_type = JSONRenderer.media_type
+        return super().handle_exception(exc)
+
     @action(
-        ('POST', 'DELETE'), detail=True, permission_classes=(IsAuthenticated,)
+        ('GET',), detail=False, permission_classes=(IsAuthenticated,),
+        pagination_class=FeedPagination,
     )
-    def favorite(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk)
+    def feed(self, request):
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(('GET',), detail=False, pagination_class=PageNumberPagination)
+    def pantry(self, request):
+        """Подбор рецептов по имеющимся продуктам: ?ingredients=<название>."""
+
+        serializer = PantrySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        page = self.paginate_queryset(
+            pantry_index.match(serializer.validated_data['ingredients'])
+        )
+        recipes = self.get_queryset().in_bulk([pk for pk, _, _ in page])
+        page = [
+            (recipes[pk], matched, size)
+            for pk, matched, size in page if pk in recipes
+        ]
+        serializer = self.get_serializer(
+            [recipe for recipe, _, _ in page], many=True
+        )
+        return self.get_paginated_response([
+            {**data, 'matched': matched, 'missing': size - matched}
+            for data, (_, matched, size) in zip(serializer.data, page)
+        ])
+
+    def toggle_recipe(self, request, pk, model):
+        """201, если связь создана, 200, если уже была; 204 или 404."""
 
-        if request.method == 'POST':
-            FavoriteRecipe.objects.create(
-                user=request.user, recipe=recipe
-            )
-            serializer = RecipeInfoSerializer(recipe)
-            return Response(
-                serializer.data,
-                status.HTTP_201_CREATED,
-            )
         if request.method == 'DELETE':
-            get_object_or_404(
-                FavoriteRecipe, user=request.user, recipe=recipe
-            ).delete()
-            return Response(
-                {'errors': 'Recipe has been removed from your favorites'},
-                status=status.HTTP_204_NO_CONTENT
-            )
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+            if not remove_links(
+                model, request.user.id, prepared_pks(Recipe, (pk,))
+            ):
+                raise NotFound
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        recipe = get_object_or_404(Recipe, id=pk)
+        created = add_links(model, request.user.id, (recipe.id,))
+        serializer = RecipeInfoSerializer(recipe)
+        return Response(
+            serializer.data,
+            status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+    @action(
+        ('POST', 'DELETE'), detail=True, permission_classes=(IsAuthenticated,)
+    )
+    def favorite(self, request, pk=None):
+        return self.toggle_recipe(request, pk, FavoriteRecipe)
 
     @action(
         ('POST', 'DELETE'), detail=True, permission_classes=(IsAuthenticated,)
     )
     def shopping_cart(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk)
+        return self.toggle_recipe(request, pk, ShoppingList)
 
+    def change_recipes(self, request, model):
+        """Добавляет или удаляет пачку рецептов, статус на каждый id."""
+
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
         if request.method == 'POST':
-            ShoppingList.objects.create(user=request.user, recipe=recipe)
-            serializer = RecipeInfoSerializer(recipe)
-            return Response(
-                serializer.data,
-                status.HTTP_201_CREATED,
+            changed = add_links(model, request.user.id, ids)
+            statuses = ('created', 'exists')
+        else:
+            changed = remove_links(model, request.user.id, ids)
+            statuses = ('deleted', 'absent')
+        unchanged = [pk for pk in ids if pk not in changed]
+        existing = set(
+            Recipe.objects.filter(id__in=unchanged).order_by().values_list(
+                'id', flat=True
             )
-        if request.method == 'DELETE':
-            get_object_or_404(
-                ShoppingList, user=request.user, recipe=recipe
-            ).delete()
-            return Response(
-                {'errors': ('Recipe has been removed '
-                            'from your shopping list')},
-                status=status.HTTP_204_NO_CONTENT
-            )
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        ) if unchanged else set()
+        results = []
+        for pk in ids:
+            if pk in changed:
+                result = statuses[0]
+            elif pk in existing:
+                result = statuses[1]
+            else:
+                result = 'not_found'
+            results.append({'id': pk, 'status': result})
+        return Response({'results': results})
 
-    @action(('GET',), detail=False, permission_classes=(IsAuthenticated,))
+    @action(
+        ('POST', 'DELETE'), detail=False, url_path='favorite',
+        permission_classes=(IsAuthenticated,)
+    )
+    def favorite_bulk(self, request):
+        return self.change_recipes(request, FavoriteRecipe)
+
+    @action(
+        ('POST', 'DELETE'), detail=False, url_path='shopping_cart',
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_cart_bulk(self, request):
+        return self.change_recipes(request, ShoppingList)
+
+    @action(
+        ('GET',), detail=False, permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_LIST_RENDERERS,
+        content_negotiation_class=ShoppingListNegotiation,
+    )
     def download_shopping_cart(self, request):
-        ingredients = IngredientsInRecipe.objects.all()
-        ingredients = ingredients.values(
+        shopping_list = IngredientsInRecipe.objects.filter(
+            recipe__in_shopping_list__user=request.user
+        ).values(
             'ingredient__name',
             'ingredient__measurement_unit'
+        ).annotate(
+            ingredient_total=Sum('amount')
+        ).order_by('ingredient__name', 'ingredient__measurement_unit')
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(request.user, shopping_list.iterator()),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
         )
-        shopping_list = ingredients.filter(
-            recipe__in_shopping_list__user=request.user
-        ).annotate(ingredient_total=Sum('amount'))
-        response = HttpResponse(content_type='text/plain')
         response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.txt"'
+            f'attachment; filename="shopping_list.{renderer.format}"'
         )
-        response.write(f"{request.user.username}'s shopping list\n\n")
-        for ingredient in shopping_list:
-            ingredients = ''.join(
-                f'{ingredient.get("ingredient__name")} - '
-                f'{ingredient.get("ingredient_total")}'
-                f'{ingredient.get("ingredient__measurement_unit")}\n'
-            )
-            response.write(f'{ingredients}')
-
         return response
@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -37,9 +38,13 @@ INSTALLED_APPS = [
     'api',
     'users',
     'recipes',
+    'jobs',
+    'metrics',
 ]
 
 MIDDLEWARE = [
+    'metrics.middleware.MetricsMiddleware',
+    'api.instrumentation.SQLInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -97,6 +102,52 @@ DATABASES = {
 }
 
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'foodgram_cache')
+        ),
+    }
+}
+
+API_CACHE_ALIAS = 'default'
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', 60))
+API_CACHE_LOCK_TIMEOUT = int(os.getenv('API_CACHE_LOCK_TIMEOUT', 5))
+CATALOGUE_CACHE_MAX_AGE = int(os.getenv('CATALOGUE_CACHE_MAX_AGE', 60))
+
+JOBS_RETRY_BACKOFF = int(os.getenv('JOBS_RETRY_BACKOFF', 10))
+# Обработчик продлевает захват выполняемых задач раз в
+# JOBS_HEARTBEAT_INTERVAL секунд; задачу без продления дольше
+# JOBS_STALE_TIMEOUT секунд считают брошенной упавшим обработчиком.
+JOBS_HEARTBEAT_INTERVAL = int(os.getenv('JOBS_HEARTBEAT_INTERVAL', 30))
+JOBS_STALE_TIMEOUT = int(os.getenv('JOBS_STALE_TIMEOUT', 600))
+JOBS_DONE_RETENTION = int(os.getenv('JOBS_DONE_RETENTION', 86400))
+
+RECIPE_IMAGE_MAX_SIZE = int(os.getenv('RECIPE_IMAGE_MAX_SIZE', 1280))
+
+FEED_PULL_THRESHOLD = int(os.getenv('FEED_PULL_THRESHOLD', 1000))
+FEED_FANOUT_BATCH_SIZE = int(os.getenv('FEED_FANOUT_BATCH_SIZE', 1000))
+FEED_FOLLOW_BACKFILL = int(os.getenv('FEED_FOLLOW_BACKFILL', 50))
+
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 24))
+TRENDING_FAVORITE_WEIGHT = float(os.getenv('TRENDING_FAVORITE_WEIGHT', 3))
+TRENDING_CART_WEIGHT = float(os.getenv('TRENDING_CART_WEIGHT', 2))
+TRENDING_VIEW_WEIGHT = float(os.getenv('TRENDING_VIEW_WEIGHT', 0.2))
+TRENDING_VIEW_FLUSH_INTERVAL = int(
+    os.getenv('TRENDING_VIEW_FLUSH_INTERVAL', 10)
+)
+TRENDING_MIN_SCORE = float(os.getenv('TRENDING_MIN_SCORE', 0.01))
+
+PANTRY_UPDATE_LIMIT = int(os.getenv('PANTRY_UPDATE_LIMIT', 1000))
+PANTRY_JOURNAL_SETTLE = int(os.getenv('PANTRY_JOURNAL_SETTLE', 60))
+PANTRY_JOURNAL_RETENTION = int(os.getenv('PANTRY_JOURNAL_RETENTION', 3600))
+
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -108,6 +159,41 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6,
 }
 
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+
+SQL_INSTRUMENTATION = (
+    os.getenv('SQL_INSTRUMENTATION', default='False').lower() == 'true'
+)
+SQL_REPEATED_QUERY_THRESHOLD = int(
+    os.getenv('SQL_REPEATED_QUERY_THRESHOLD', 3)
+)
+
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', default='False').lower() == 'true'
+ASYNC_VIEW_THREADS = int(os.getenv('ASYNC_VIEW_THREADS', 16))
+
+METRICS_ENABLED = (
+    os.getenv('METRICS_ENABLED', default='True').lower() == 'true'
+)
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram_metrics')
+)
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 1))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.instrumentation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -6,6 +6,8 @@ from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 
+from metrics.views import metrics
+
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -26,8 +28,15 @@ urlpatterns = [
         schema_view.with_ui('swagger', cache_timeout=0),
         name='schema-swagger-ui'
     ),
-    path('api/', include('api.urls', namespace='api')),
+    path(
+        'api/',
+        include(
+            'api.urls_async' if settings.ASYNC_VIEWS else 'api.urls',
+            namespace='api'
+        )
+    ),
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
 ]
 
 if settings.DEBUG:
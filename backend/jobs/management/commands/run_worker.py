@@ -0,0 +1,95 @@
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait,
+)
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.queue import (
+    claim_jobs, heartbeat, prune_jobs, requeue_stale_jobs, run_job,
+)
+from jobs.worker import init_process
+
+
+STALE_CHECK_INTERVAL = 60
+PRUNE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = 'run background jobs from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2)
+        parser.add_argument(
+            '--pool', choices=('thread', 'process'), default='thread'
+        )
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument(
+            '--once', action='store_true',
+            help='exit when there are no jobs ready to run'
+        )
+
+    def get_executor(self, pool, concurrency):
+        if pool == 'process':
+            connections.close_all()
+            return ProcessPoolExecutor(
+                max_workers=concurrency,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_process,
+            )
+        return ThreadPoolExecutor(max_workers=concurrency)
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.stdout.write(
+            f'Worker started: {options["pool"]} pool, '
+            f'concurrency {concurrency}'
+        )
+
+        running = {}
+        stale_checked = pruned = beaten = float('-inf')
+        with self.get_executor(options['pool'], concurrency) as executor:
+            while not self.stopping:
+                now = time.monotonic()
+                if now - stale_checked > STALE_CHECK_INTERVAL:
+                    requeue_stale_jobs()
+                    stale_checked = now
+                if now - pruned > PRUNE_INTERVAL:
+                    prune_jobs()
+                    pruned = now
+                if now - beaten > settings.JOBS_HEARTBEAT_INTERVAL:
+                    heartbeat(list(running.values()))
+                    beaten = now
+
+                claimed = claim_jobs(concurrency - len(running))
+                for job_id in claimed:
+                    running[executor.submit(run_job, job_id)] = job_id
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, _ = wait(
+                    running, timeout=options['poll_interval'],
+                    return_when=FIRST_COMPLETED,
+                )
+                for future in done:
+                    del running[future]
+                    if future.exception() is not None:
+                        self.stderr.write(
+                            f'Job runner failed: {future.exception()}'
+                        )
+
+            wait(running)
+        self.stdout.write(self.style.SUCCESS('Worker stopped'))
@@ -0,0 +1,44 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Модель фоновой задачи в очереди"""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'в очереди'),
+        (RUNNING, 'выполняется'),
+        (DONE, 'выполнена'),
+        (FAILED, 'завершилась ошибкой'),
+    )
+
+    task = models.CharField('задача', max_length=200)
+    payload = models.JSONField('аргументы', default=dict)
+    status = models.CharField(
+        'статус', max_length=16, choices=STATUSES, default=QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField('попытки', default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        'максимум попыток', default=5
+    )
+    run_at = models.DateTimeField('запуск не раньше', default=timezone.now)
+    last_error = models.TextField('последняя ошибка', blank=True)
+    created = models.DateTimeField('создана', auto_now_add=True)
+    updated = models.DateTimeField('обновлена', auto_now=True)
+
+    class Meta:
+        ordering = ('run_at', 'id')
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = (
+            models.Index(
+                fields=('status', 'run_at'), name='job_status_run_at_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.task} ({self.status})'
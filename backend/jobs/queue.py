@@ -0,0 +1,129 @@
+from datetime import timedelta
+import traceback
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+
+TASKS = {}
+
+
+def task(func):
+    """
+    Регистрирует функцию как фоновую задачу. Аргументы задачи должны
+    сериализоваться в JSON. Добавляет функции метод enqueue.
+    """
+
+    name = f'{func.__module__}.{func.__name__}'
+    TASKS[name] = func
+    func.enqueue = lambda **kwargs: enqueue(name, **kwargs)
+    return func
+
+
+def enqueue(task_name, /, delay=0, max_attempts=None, **payload):
+    """
+    Ставит задачу в очередь. Внутри транзакции задача станет видна
+    обработчику только после её фиксации.
+    """
+
+    job = Job(
+        task=task_name,
+        payload=payload,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    if max_attempts is not None:
+        job.max_attempts = max_attempts
+    job.save()
+    return job
+
+
+def claim_jobs(limit):
+    """
+    Захватывает до limit готовых к запуску задач. Захват — условный
+    UPDATE по статусу, поэтому несколько обработчиков не возьмут одну
+    задачу ни в SQLite, ни в PostgreSQL.
+    """
+
+    now = timezone.now()
+    candidates = Job.objects.filter(
+        status=Job.QUEUED, run_at__lte=now
+    ).values_list('id', flat=True)[:limit * 2]
+    claimed = []
+    for job_id in candidates:
+        updated = Job.objects.filter(id=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING, attempts=F('attempts') + 1, updated=now
+        )
+        if updated:
+            claimed.append(job_id)
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def heartbeat(job_ids):
+    """Продлевает захват выполняемых задач."""
+
+    if not job_ids:
+        return 0
+    return Job.objects.filter(id__in=job_ids, status=Job.RUNNING).update(
+        updated=timezone.now()
+    )
+
+
+def requeue_stale_jobs():
+    """
+    Возвращает в очередь задачи, зависшие у упавшего обработчика: живой
+    обработчик продлевает захват раз в JOBS_HEARTBEAT_INTERVAL секунд.
+    """
+
+    stale = timezone.now() - timedelta(seconds=settings.JOBS_STALE_TIMEOUT)
+    return Job.objects.filter(
+        status=Job.RUNNING, updated__lt=stale
+    ).update(status=Job.QUEUED, updated=timezone.now())
+
+
+def prune_jobs(batch_size=1000):
+    """
+    Удаляет выполненные задачи старше JOBS_DONE_RETENTION секунд пачками.
+    Задачи с ошибкой остаются для разбора.
+    """
+
+    cutoff = timezone.now() - timedelta(seconds=settings.JOBS_DONE_RETENTION)
+    done = Job.objects.filter(
+        status=Job.DONE, run_at__lt=cutoff, updated__lt=cutoff
+    )
+    deleted = 0
+    while batch := list(done.values_list('id', flat=True)[:batch_size]):
+        deleted += Job.objects.filter(id__in=batch).delete()[0]
+    return deleted
+
+
+def run_job(job_id):
+    """Выполняет задачу; при ошибке откладывает повтор с нарастающей паузой."""
+
+    close_old_connections()
+    try:
+        job = Job.objects.get(id=job_id)
+        try:
+            TASKS[job.task](**job.payload)
+        except Exception:
+            job.last_error = traceback.format_exc()
+            if job.attempts >= job.max_attempts:
+                job.status = Job.FAILED
+            else:
+                job.status = Job.QUEUED
+                job.run_at = timezone.now() + timedelta(
+                    seconds=settings.JOBS_RETRY_BACKOFF
+                    * 2 ** (job.attempts - 1)
+                )
+        else:
+            job.status = Job.DONE
+            job.last_error = ''
+        job.save(update_fields=('status', 'run_at', 'last_error', 'updated'))
+        return job.status
+    finally:
+        close_old_connections()
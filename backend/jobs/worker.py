@@ -0,0 +1,10 @@
+import django
+
+
+def init_process():
+    """
+    Инициализирует Django в дочернем процессе пула. Модуль не импортирует
+    модели, чтобы его можно было загрузить до django.setup().
+    """
+
+    django.setup()
@@ -0,0 +1,97 @@
+import tempfile
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import ResolverMatch
+
+from metrics.middleware import MetricsMiddleware, QueryMeter
+from metrics.registry import Registry
+
+
+class Command(BaseCommand):
+    help = (
+        'measure the cost of recording metrics on the request path and '
+        'fail if the per-request overhead exceeds the limit'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=100_000)
+        parser.add_argument(
+            '--max-overhead-us', type=float, default=20.0,
+            help='allowed middleware overhead per request, microseconds'
+        )
+
+    def per_call(self, statement, number):
+        """Лучшее из пяти прогонов, в микросекундах на вызов."""
+
+        return min(timeit.repeat(statement, number=number, repeat=5)) / (
+            number / 1_000_000
+        )
+
+    def handle(self, *args, **options):
+        number = options['number']
+        registry = Registry()
+        counter = registry.counter('bench_total', '', ('view', 'action'))
+        histogram = registry.histogram('bench_seconds', '', ('view',))
+        meter = QueryMeter()
+
+        def execute(sql, params, many, context):
+            return None
+
+        request = RequestFactory().get('/api/recipes/')
+
+        def view(request):
+            return HttpResponse()
+
+        view.cls = type('RecipeViewSet', (), {})
+        view.actions = {'get': 'list'}
+        request.resolver_match = ResolverMatch(view, (), {})
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            METRICS_ENABLED=True, METRICS_DIR=directory
+        ):
+            middleware = MetricsMiddleware(view)
+
+            def bare():
+                view(request)
+
+            def instrumented():
+                middleware(request)
+
+            results = {
+                'counter inc': self.per_call(
+                    lambda: counter.inc('RecipeViewSet', 'list'), number
+                ),
+                'histogram observe': self.per_call(
+                    lambda: histogram.observe(0.042, 'RecipeViewSet'), number
+                ),
+                'query wrapper': self.per_call(
+                    lambda: meter(execute, '', (), False, {}), number
+                ) - self.per_call(
+                    lambda: execute('', (), False, {}), number
+                ),
+                'request overhead': self.per_call(
+                    instrumented, number // 10
+                ) - self.per_call(bare, number // 10),
+            }
+            for _ in range(200):
+                counter.inc(str(_), 'list')
+                histogram.observe(0.1, str(_))
+            results['flush, 400 series'] = self.per_call(
+                registry.flush, 100
+            )
+        for name, value in results.items():
+            self.stdout.write(f'{name:<20} {value:>10.2f} us')
+
+        overhead = results['request overhead']
+        if overhead > options['max_overhead_us']:
+            raise CommandError(
+                f'Metrics add {overhead:.2f} us per request, more than '
+                f'{options["max_overhead_us"]} us'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Metrics add {overhead:.2f} us per request'
+        ))
@@ -0,0 +1,88 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .registry import (
+    DB_QUERIES, DB_QUERY_DURATION, REQUEST_DURATION, REQUESTS, registry,
+)
+
+
+UNRESOLVED = ('unresolved', 'none')
+
+
+class QueryMeter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """
+    Записывает число, длительность и статусы запросов, а также число и
+    время SQL-запросов с метками viewset и action DRF. Включается
+    настройкой METRICS_ENABLED. Работает и в синхронном, и в асинхронном
+    стеке: асинхронные view сами ставят обёртки из
+    request.execute_wrappers на соединения своего пула потоков. Запросы
+    синхронных view под ASGI в счётчики SQL не попадают.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        queries = QueryMeter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        self.record(request, response, started, queries)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        queries = QueryMeter()
+        request.execute_wrappers = [
+            *getattr(request, 'execute_wrappers', ()), queries
+        ]
+        response = await self.get_response(request)
+        self.record(request, response, started, queries)
+        return response
+
+    def record(self, request, response, started, queries):
+        duration = time.perf_counter() - started
+        view, action = self.get_labels(request)
+        REQUESTS.inc(view, action, str(response.status_code))
+        REQUEST_DURATION.observe(duration, view, action)
+        if queries.count:
+            DB_QUERIES.inc(view, action, amount=queries.count)
+            DB_QUERY_DURATION.inc(view, action, amount=queries.duration)
+        registry.maybe_flush()
+
+    def get_labels(self, request):
+        match = request.resolver_match
+        if match is None:
+            return UNRESOLVED
+        view = getattr(match.func, 'cls', match.func)
+        actions = getattr(match.func, 'actions', None) or {}
+        method = request.method.lower()
+        return view.__name__, actions.get(method, method)
@@ -0,0 +1,360 @@
+import atexit
+from bisect import bisect_left
+import fcntl
+import json
+import os
+from pathlib import Path
+from threading import Lock
+import time
+
+from django.conf import settings
+
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+ARCHIVE_NAME = 'archived.json'
+ARCHIVE_LOCK_NAME = 'archived.lock'
+
+
+def format_labels(names, values, extra=''):
+    pairs = [
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\').replace(
+            '"', r'\"'
+        ).replace('\n', r'\n'))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def add_samples(totals, samples):
+    """Прибавляет снимок [[имя, метки, значение], ...] к totals."""
+
+    for name, labels, value in samples:
+        metric_samples = totals.setdefault(name, {})
+        labels = tuple(labels)
+        current = metric_samples.get(labels)
+        if current is None:
+            metric_samples[labels] = value
+        elif isinstance(value, list):
+            metric_samples[labels] = [a + b for a, b in zip(current, value)]
+        else:
+            metric_samples[labels] = current + value
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def merge_snapshots(totals, paths):
+    """
+    Прибавляет к totals снимки из paths и возвращает те, что удалось
+    прочитать.
+    """
+
+    merged = []
+    for path in paths:
+        try:
+            add_samples(totals, json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+        merged.append(path)
+    return merged
+
+
+def read_archive(directory):
+    try:
+        return json.loads((directory / ARCHIVE_NAME).read_text())
+    except FileNotFoundError:
+        return {'merged': [], 'samples': []}
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def render(self, samples):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.type}'
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = (self.name, labels)
+        values = self.registry.values
+        with self.registry.lock:
+            values[key] = values.get(key, 0) + amount
+
+    def render(self, samples):
+        yield from super().render(samples)
+        for labels, value in sorted(samples.items()):
+            yield (
+                f'{self.name}{format_labels(self.labelnames, labels)} '
+                f'{format_value(value)}'
+            )
+
+
+class Histogram(Metric):
+    """
+    Гистограмма хранит число наблюдений по каждому интервалу отдельно,
+    а в выводе накапливает их, как того требует формат Prometheus.
+    Последние два элемента значения — сумма и общее число наблюдений.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        position = bisect_left(self.buckets, value)
+        key = (self.name, labels)
+        values = self.registry.values
+        with self.registry.lock:
+            entry = values.get(key)
+            if entry is None:
+                entry = values[key] = [0] * (len(self.buckets) + 3)
+            entry[position] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self, samples):
+        yield from super().render(samples)
+        bounds = self.buckets + (float('inf'),)
+        for labels, entry in sorted(samples.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, entry):
+                cumulative += count
+                label_text = format_labels(
+                    self.labelnames, labels, f'le="{format_value(bound)}"'
+                )
+                yield f'{self.name}_bucket{label_text} {cumulative}'
+            label_text = format_labels(self.labelnames, labels)
+            yield f'{self.name}_sum{label_text} {format_value(entry[-2])}'
+            yield f'{self.name}_count{label_text} {entry[-1]}'
+
+
+class Gauge(Metric):
+    """
+    Значение, которое вычисляется в момент сбора функцией collect и не
+    сохраняется в файлы процессов: например, длина очереди задач.
+    """
+
+    type = 'gauge'
+
+    def __init__(self, registry, name, documentation, labelnames=(),
+                 collect=None):
+        super().__init__(registry, name, documentation, labelnames)
+        self.collect = collect
+
+    def render(self, samples):
+        yield from super().render(samples)
+        for labels, value in sorted(self.collect().items()):
+            yield (
+                f'{self.name}{format_labels(self.labelnames, labels)} '
+                f'{format_value(value)}'
+            )
+
+
+class Registry:
+    """
+    Реестр метрик процесса.
+
+    Запись метрики — это изменение словаря под блокировкой, без обращений
+    к диску. Не чаще раза в METRICS_FLUSH_INTERVAL секунд процесс
+    атомарно переписывает свой снимок в файл в каталоге METRICS_DIR,
+    а при сборе снимки всех процессов, в том числе завершившихся,
+    суммируются. Так счётчики остаются монотонными при перезапуске
+    воркеров gunicorn. Снимки завершившихся процессов при сборе
+    переносятся в общий архив ARCHIVE_NAME, и число файлов не растёт с
+    каждым перезапуском.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.metrics = {}
+        self.values = {}
+        self.pid = None
+        self.path = None
+        self.flushed = 0
+        atexit.register(self.flush)
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), **kwargs):
+        return self.register(
+            Histogram(self, name, documentation, labelnames, **kwargs)
+        )
+
+    def gauge(self, name, documentation, labelnames=(), collect=None):
+        return self.register(
+            Gauge(self, name, documentation, labelnames, collect)
+        )
+
+    def _check_process(self):
+        """После fork дочерний процесс начинает счёт со своего файла."""
+
+        pid = os.getpid()
+        if pid != self.pid:
+            with self.lock:
+                if self.pid is not None:
+                    self.values = {}
+                self.pid = pid
+                self.path = Path(settings.METRICS_DIR) / (
+                    f'{pid}-{time.time_ns()}.json'
+                )
+
+    def flush(self):
+        self._check_process()
+        with self.lock:
+            samples = [
+                [name, list(labels), value]
+                for (name, labels), value in self.values.items()
+            ]
+        self.flushed = time.monotonic()
+        if not samples:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix('.tmp')
+        temporary.write_text(json.dumps(samples))
+        os.replace(temporary, self.path)
+
+    def maybe_flush(self):
+        if time.monotonic() - self.flushed >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def archive(self):
+        """
+        Суммирует снимки завершившихся процессов в архив и удаляет их.
+        Архив хранит имена перенесённых файлов: если процесс прервётся
+        между записью архива и удалением снимков, они не попадут в сумму
+        дважды. Архив переписывает один процесс за раз, остальные в это
+        время его пропускают.
+        """
+
+        directory = Path(settings.METRICS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / ARCHIVE_LOCK_NAME, 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            archive = read_archive(directory)
+            merged = set(archive['merged'])
+            dead = []
+            for path in directory.glob('*-*.json'):
+                if path.name in merged:
+                    path.unlink(missing_ok=True)
+                elif path != self.path and not process_alive(
+                    int(path.name.split('-', 1)[0])
+                ):
+                    dead.append(path)
+            if not dead:
+                return
+            totals = {}
+            add_samples(totals, archive['samples'])
+            archived = merge_snapshots(totals, dead)
+            merged.update(path.name for path in archived)
+            existing = {path.name for path in directory.glob('*-*.json')}
+            archive = {
+                'merged': sorted(merged & existing),
+                'samples': [
+                    [name, list(labels), value]
+                    for name, metric_samples in totals.items()
+                    for labels, value in metric_samples.items()
+                ],
+            }
+            temporary = directory / f'{ARCHIVE_NAME}.tmp'
+            temporary.write_text(json.dumps(archive))
+            os.replace(temporary, directory / ARCHIVE_NAME)
+            for path in archived:
+                path.unlink(missing_ok=True)
+
+    def aggregate(self):
+        """
+        Суммирует архив и снимки процессов из METRICS_DIR. Чтение идёт
+        под разделяемой блокировкой архива, чтобы снимок не пропал из
+        суммы между чтением архива и списка файлов.
+        """
+
+        directory = Path(settings.METRICS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        totals = {}
+        with open(directory / ARCHIVE_LOCK_NAME, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            try:
+                archive = read_archive(directory)
+            except (OSError, ValueError):
+                archive = {'merged': [], 'samples': []}
+            add_samples(totals, archive['samples'])
+            merged = set(archive['merged'])
+            merge_snapshots(totals, (
+                path for path in directory.glob('*-*.json')
+                if path.name not in merged
+            ))
+        return totals
+
+    def render(self):
+        self.flush()
+        self.archive()
+        totals = self.aggregate()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.extend(metric.render(totals.get(name, {})))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUESTS = registry.counter(
+    'http_requests_total', 'HTTP requests by view, action and status.',
+    ('view', 'action', 'status'),
+)
+REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency.',
+    ('view', 'action'),
+)
+DB_QUERIES = registry.counter(
+    'db_queries_total', 'SQL queries executed while handling requests.',
+    ('view', 'action'),
+)
+DB_QUERY_DURATION = registry.counter(
+    'db_query_duration_seconds_total',
+    'Time spent in SQL queries while handling requests.',
+    ('view', 'action'),
+)
+CACHE_REQUESTS = registry.counter(
+    'api_cache_requests_total',
+    'API cache lookups: response cache hits, stale hits and misses, '
+    'ETag revalidations.',
+    ('cache', 'result'),
+)
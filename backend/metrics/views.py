@@ -0,0 +1,30 @@
+from django.db.models import Count
+from django.http import HttpResponse
+
+from .registry import CONTENT_TYPE, registry
+from jobs.models import Job
+
+
+QUEUE_STATUSES = (Job.QUEUED, Job.RUNNING, Job.FAILED)
+
+
+def job_queue_depth():
+    """Выполненные задачи не считаются: их число только растёт."""
+
+    depth = dict.fromkeys(QUEUE_STATUSES, 0)
+    depth.update(
+        Job.objects.filter(status__in=QUEUE_STATUSES).order_by().values_list(
+            'status'
+        ).annotate(Count('id'))
+    )
+    return {(status,): count for status, count in depth.items()}
+
+
+registry.gauge(
+    'jobs_queue_depth', 'Background jobs by status.', ('status',),
+    collect=job_queue_depth,
+)
+
+
+def metrics(request):
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -39,7 +39,7 @@ class RecipeAdmin(admin.ModelAdmin):
         )
 
     def favorite_count(self, obj):
-        return obj.favorite_recipe.count()
+        return obj.favorites_count
 
     display_tags.short_description = 'tags'
     display_ingredients.short_description = 'ingredients'
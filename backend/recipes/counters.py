@@ -0,0 +1,111 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import FavoriteRecipe, Recipe, ShoppingList
+from .transactions import on_commit_once
+from users.models import Follow, User
+
+
+COUNTERS = (
+    (Recipe, 'favorites_count', FavoriteRecipe, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingList, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def update_counter(model, ids, field, delta):
+    """Атомарно изменяет счётчик на delta, не опуская его ниже нуля."""
+
+    value = F(field) + delta
+    if delta < 0:
+        value = Greatest(value, 0)
+    return model.objects.filter(id__in=ids).update(**{field: value})
+
+
+def changes_applier():
+    def apply():
+        apply_changes(apply.changes, apply.deleted)
+
+    apply.changes = {}
+    apply.deleted = set()
+    return apply
+
+
+def pending_changes():
+    """
+    Изменения счётчиков, отложенные до фиксации текущей транзакции:
+    changes — {(модель, поле): Counter(id: delta)}, deleted — пары
+    (модель, id) удаляемых строк. Для каждого уровня точек сохранения
+    заводится своя запись, чтобы откат точки отбрасывал и её изменения.
+    """
+
+    return on_commit_once('counters', changes_applier)
+
+
+def apply_changes(changes, deleted):
+    """
+    Применяет накопленные изменения: строки, удалённые вместе с
+    дочерними, пропускаются, остальные обновляются одним UPDATE на каждое
+    различное значение delta.
+    """
+
+    for (model, field), deltas in changes.items():
+        by_delta = {}
+        for pk, delta in deltas.items():
+            if delta and (model, pk) not in deleted:
+                by_delta.setdefault(delta, []).append(pk)
+        for delta, ids in by_delta.items():
+            update_counter(model, ids, field, delta)
+
+
+def update_counter_on_commit(model, ids, field, delta):
+    """
+    Накапливает изменения счётчика до конца транзакции. Каскадное
+    удаление шлёт post_delete на каждую дочернюю строку; так оно
+    превращается в несколько UPDATE вместо запроса на строку. Вне
+    транзакции счётчик меняется сразу.
+    """
+
+    if not transaction.get_connection().in_atomic_block:
+        return update_counter(model, ids, field, delta)
+    deltas = pending_changes().changes.setdefault((model, field), Counter())
+    for pk in ids:
+        deltas[pk] += delta
+
+
+def mark_deleted(model, pk):
+    """Отмечает удаляемую строку: её счётчики больше не обновляются."""
+
+    if transaction.get_connection().in_atomic_block:
+        pending_changes().deleted.add((model, pk))
+
+
+def actual_count(related_model, related_field):
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(
+                **{related_field: OuterRef('pk')}
+            ).order_by().values(related_field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0,
+    )
+
+
+def recount(model, field, related_model, related_field, ids):
+    """Пересчитывает счётчик для указанных строк, возвращает число правок."""
+
+    actual = actual_count(related_model, related_field)
+    drifted = list(
+        model.objects.filter(id__in=ids).annotate(
+            actual=actual
+        ).exclude(**{field: F('actual')}).values_list('id', flat=True)
+    )
+    if drifted:
+        model.objects.filter(id__in=drifted).update(**{field: actual})
+    return len(drifted)
@@ -0,0 +1,130 @@
+from heapq import merge
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe, TimelineEntry
+from users.models import Follow, User
+
+
+def popular_authors(user_id):
+    """
+    Авторы из подписок пользователя, рецепты которых не раскладываются
+    по лентам, а подтягиваются при чтении.
+    """
+
+    return list(Follow.objects.filter(
+        user_id=user_id,
+        author__followers_count__gte=settings.FEED_PULL_THRESHOLD,
+    ).values_list('author_id', flat=True))
+
+
+def before(position, date_field, id_field):
+    """Условие «строго после position» для порядка (-дата, -id)."""
+
+    if position is None:
+        return Q()
+    pub_date, pk = position
+    return Q(**{f'{date_field}__lt': pub_date}) | Q(**{
+        date_field: pub_date, f'{id_field}__lt': pk
+    })
+
+
+def latest_recipes(author_ids, limit):
+    """
+    Рецепты, входящие в limit последних по (-pub_date, -id) у каждого из
+    авторов author_ids. Один проход ROW_NUMBER() по индексу (author,
+    -pub_date, -id) вместо коррелированного подзапроса на каждую строку.
+    """
+
+    author_ids = list(author_ids)
+    if not author_ids or limit <= 0:
+        return Recipe.objects.none()
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(author_ids))
+    sql = (
+        f'SELECT {quote("id")} FROM ('
+        f'SELECT {quote("id")}, ROW_NUMBER() OVER ('
+        f'PARTITION BY {quote("author_id")} '
+        f'ORDER BY {quote("pub_date")} DESC, {quote("id")} DESC'
+        f') AS position FROM {quote(Recipe._meta.db_table)} '
+        f'WHERE {quote("author_id")} IN ({placeholders})'
+        f') AS ranked WHERE position <= %s'
+    )
+    return Recipe.objects.filter(id__in=RawSQL(sql, [*author_ids, limit]))
+
+
+def feed_positions(user_id, position, limit):
+    """
+    Возвращает до limit пар (pub_date, recipe_id) ленты пользователя,
+    следующих за position. Записи ленты сливаются со свежими рецептами
+    популярных авторов; каждый источник читается по индексу не дальше
+    limit строк.
+    """
+
+    sources = [
+        TimelineEntry.objects.filter(
+            before(position, 'pub_date', 'recipe_id'), user_id=user_id
+        ).order_by('-pub_date', '-recipe_id').values_list(
+            'pub_date', 'recipe_id'
+        )[:limit]
+    ]
+    authors = popular_authors(user_id)
+    if authors:
+        sources.append(
+            Recipe.objects.filter(
+                before(position, 'pub_date', 'id'), author_id__in=authors
+            ).order_by('-pub_date', '-id').values_list(
+                'pub_date', 'id'
+            )[:limit]
+        )
+    positions = []
+    for item in merge(*sources, reverse=True):
+        if positions and positions[-1] == item:
+            continue
+        positions.append(item)
+        if len(positions) == limit:
+            break
+    return positions
+
+
+def fill_timelines(follows, per_author):
+    """
+    Добавляет в ленты подписчиков до per_author последних рецептов
+    каждого автора из пар (user_id, author_id). Популярные авторы
+    пропускаются. Возвращает число переданных на вставку записей.
+    """
+
+    by_author = {}
+    for user_id, author_id in follows:
+        by_author.setdefault(author_id, []).append(user_id)
+    authors = User.objects.filter(
+        id__in=by_author,
+        followers_count__lt=settings.FEED_PULL_THRESHOLD,
+    ).values_list('id', flat=True)
+    recipes = {}
+    for pk, author_id, pub_date in latest_recipes(
+        authors, per_author
+    ).values_list('id', 'author_id', 'pub_date'):
+        recipes.setdefault(author_id, []).append((pk, pub_date))
+    entries = [
+        TimelineEntry(user_id=user_id, recipe_id=pk, pub_date=pub_date)
+        for author_id, author_recipes in recipes.items()
+        for user_id in by_author[author_id]
+        for pk, pub_date in author_recipes
+    ]
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=settings.FEED_FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    return len(entries)
+
+
+def clear_timeline(user_id, author_id):
+    """Убирает рецепты автора из ленты пользователя после отписки."""
+
+    return TimelineEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
@@ -0,0 +1,195 @@
+import csv
+from itertools import islice
+import json
+from pathlib import Path
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db.transaction import atomic
+
+from api.cache import bump_version
+
+
+FORMATS = ('csv', 'json', 'ndjson')
+MAX_REPORTED_ERRORS = 10
+
+
+def read_rows(path, file_format, fields):
+    """
+    Построчно читает файл каталога и отдаёт словари с полями fields.
+    CSV и NDJSON читаются потоком; JSON-массив стандартная библиотека
+    умеет загрузить только целиком. Вместо нечитаемой строки NDJSON
+    отдаётся ValidationError, чтобы она попала в сводку как неверная.
+    """
+
+    with open(path, encoding='utf-8') as file:
+        if file_format == 'csv':
+            for row in csv.reader(file):
+                yield dict(zip(fields, row))
+        elif file_format == 'ndjson':
+            for line in file:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as error:
+                    yield ValidationError(f'invalid JSON: {error}')
+        else:
+            yield from json.load(file)
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class ImportCommand(BaseCommand):
+    """
+    Базовая команда импорта каталога. Проверяет строки в памяти, пишет их
+    пачками через bulk_create(ignore_conflicts=True) и bulk_update, в режиме
+    --sync удаляет строки, которых нет в файле. Вместо вывода по каждой
+    строке печатает итоговую сводку.
+    """
+
+    model = None
+    key_fields = ()
+    fields = ()
+    default_path = ''
+    protected_relation = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=str(Path(settings.BASE_DIR) / self.default_path)
+        )
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--sync', action='store_true',
+            help='delete rows missing from the file'
+        )
+        parser.add_argument(
+            '--no-update', action='store_true',
+            help='do not update existing rows, only create new ones'
+        )
+
+    def get_format(self, path, file_format):
+        if file_format:
+            return file_format
+        suffix = Path(path).suffix.lstrip('.').lower()
+        if suffix not in FORMATS:
+            raise CommandError(f'Unknown file format: {path}')
+        return suffix
+
+    def clean_row(self, row):
+        cleaned = {}
+        for name in self.fields:
+            value = row.get(name)
+            if isinstance(value, str):
+                value = value.strip()
+            cleaned[name] = self.model._meta.get_field(name).clean(
+                value, None
+            )
+        return cleaned
+
+    def get_key(self, row):
+        return tuple(row[name] for name in self.key_fields)
+
+    def write_batch(self, rows, update):
+        value_fields = [
+            name for name in self.fields if name not in self.key_fields
+        ]
+        first_key = self.key_fields[0]
+        existing = {
+            self.get_key(row): row
+            for row in self.model.objects.filter(**{
+                f'{first_key}__in': {row[first_key] for row in rows.values()}
+            }).values('id', *self.fields)
+        }
+        created = [
+            self.model(**row) for key, row in rows.items()
+            if key not in existing
+        ]
+        changed = [
+            self.model(id=existing[key]['id'], **row)
+            for key, row in rows.items()
+            if key in existing and any(
+                existing[key][name] != row[name] for name in value_fields
+            )
+        ] if update and value_fields else []
+
+        with atomic():
+            self.model.objects.bulk_create(created, ignore_conflicts=True)
+            if changed:
+                self.model.objects.bulk_update(changed, value_fields)
+        return len(created), len(changed)
+
+    def delete_missing(self, seen, batch_size):
+        deleted = protected = 0
+        rows = self.model.objects.values_list('id', *self.key_fields)
+        for batch in batches(rows.iterator(chunk_size=batch_size), batch_size):
+            missing = [row[0] for row in batch if row[1:] not in seen]
+            if not missing:
+                continue
+            queryset = self.model.objects.filter(id__in=missing)
+            if self.protected_relation:
+                in_use = queryset.filter(**{
+                    f'{self.protected_relation}__isnull': False
+                }).distinct().count()
+                protected += in_use
+                queryset = queryset.filter(**{
+                    f'{self.protected_relation}__isnull': True
+                })
+            deleted += queryset.delete()[1].get(self.model._meta.label, 0)
+        return deleted, protected
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = self.get_format(path, options['format'])
+        batch_size = options['batch_size']
+        update = not options['no_update']
+        started = time.monotonic()
+        total = invalid = created = updated = 0
+        seen = set()
+        errors = []
+
+        for batch in batches(
+            read_rows(path, file_format, self.fields), batch_size
+        ):
+            rows = {}
+            for row in batch:
+                total += 1
+                try:
+                    if isinstance(row, ValidationError):
+                        raise row
+                    row = self.clean_row(row)
+                except (ValidationError, AttributeError) as error:
+                    invalid += 1
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append(f'row {total}: {error}')
+                    continue
+                rows[self.get_key(row)] = row
+            batch_created, batch_updated = self.write_batch(rows, update)
+            created += batch_created
+            updated += batch_updated
+            if options['sync']:
+                seen.update(rows)
+
+        deleted = protected = 0
+        if options['sync']:
+            deleted, protected = self.delete_missing(seen, batch_size)
+        bump_version('catalogue', 'recipes')
+
+        for error in errors:
+            self.stderr.write(self.style.WARNING(f'Invalid {error}'))
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{self.model._meta.verbose_name_plural} from {path}: '
+            f'{total} rows read, {invalid} invalid, {created} created, '
+            f'{updated} updated, {deleted} deleted, '
+            f'{protected} kept as used in recipes; '
+            f'{elapsed:.2f}s, {total / elapsed if elapsed else 0:.0f} rows/s'
+        ))
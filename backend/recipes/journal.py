@@ -0,0 +1,82 @@
+from datetime import timedelta
+from itertools import count
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import RecipeChange
+from .transactions import on_commit_once
+
+
+PRUNE_EVERY = 1000
+
+commits = count(1)
+
+
+def journal_pruner():
+    def prune():
+        if next(commits) % PRUNE_EVERY == 0:
+            prune_journal()
+
+    prune.journaled = set()
+    return prune
+
+
+def pending_journal():
+    """
+    id рецептов, уже записанных в журнал на текущем уровне точек
+    сохранения транзакции. Откат точки отбрасывает и записи журнала, и
+    этот набор.
+    """
+
+    return on_commit_once('journal', journal_pruner).journaled
+
+
+def journal_recipes(recipe_ids):
+    """
+    Записывает id изменённых рецептов в журнал в той же транзакции, что и
+    само изменение: запись видна читателям ровно тогда, когда видно
+    изменение. Повторы внутри транзакции пропускаются.
+    """
+
+    recipe_ids = set(recipe_ids)
+    if transaction.get_connection().in_atomic_block:
+        journaled = pending_journal()
+        recipe_ids -= journaled
+        journaled |= recipe_ids
+    RecipeChange.objects.bulk_create(
+        RecipeChange(recipe_id=pk) for pk in sorted(recipe_ids)
+    )
+
+
+def journal_all():
+    """Отмечает изменение всех рецептов, например после импорта."""
+
+    RecipeChange.objects.create(recipe_id=None)
+
+
+def prune_journal():
+    """Удаляет записи старше PANTRY_JOURNAL_RETENTION секунд."""
+
+    return RecipeChange.objects.filter(
+        created__lt=timezone.now() - timedelta(
+            seconds=settings.PANTRY_JOURNAL_RETENTION
+        )
+    ).delete()
+
+
+def read_journal(after, gaps, limit):
+    """
+    Возвращает записи журнала (id, recipe_id) с id больше after или из
+    gaps по возрастанию id, не больше limit + 1, и признак того, что
+    запись after ещё на месте. Без неё нельзя поручиться, что журнал не
+    очищали.
+    """
+
+    rows = list(RecipeChange.objects.filter(
+        Q(id__gte=after) | Q(id__in=gaps)
+    ).order_by('id').values_list('id', 'recipe_id')[:limit + 2])
+    anchored = not after or any(pk == after for pk, _ in rows)
+    return [row for row in rows if row[0] != after], anchored
@@ -0,0 +1,90 @@
+from django.db import connection, transaction
+
+from .counters import COUNTERS, update_counter
+from .models import FavoriteRecipe, ShoppingList
+from .trending import score_links
+from users.models import Follow
+
+
+OWNER_FIELD = 'user'
+TARGET_FIELDS = {
+    FavoriteRecipe: 'recipe',
+    ShoppingList: 'recipe',
+    Follow: 'author',
+}
+
+
+def columns(model):
+    target = model._meta.get_field(TARGET_FIELDS[model])
+    return (
+        model._meta.get_field(OWNER_FIELD).column,
+        target.column,
+        target.related_model._meta.db_table,
+        target.related_model._meta.pk.column,
+    )
+
+
+def update_counters(model, target_ids, delta):
+    """
+    Сырые запросы обходят сигналы post_save и post_delete, поэтому
+    денормализованные счётчики правятся здесь же.
+    """
+
+    for counted, field, related_model, related_field in COUNTERS:
+        if related_model is model and target_ids:
+            update_counter(counted, target_ids, field, delta)
+
+
+def add_links(model, user_id, target_ids):
+    """
+    Одним запросом INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING
+    связывает пользователя с существующими объектами из target_ids.
+    Несуществующие id отсекает SELECT, уже существующие связи - ON
+    CONFLICT, поэтому повторы и гонки не приводят к IntegrityError.
+    Возвращает множество id, для которых связь действительно создана.
+    """
+
+    target_ids = list(target_ids)
+    if not target_ids:
+        return set()
+    owner, target, target_table, target_pk = columns(model)
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    sql = (
+        f'INSERT INTO {quote(model._meta.db_table)} '
+        f'({quote(owner)}, {quote(target)}) '
+        f'SELECT %s, {quote(target_pk)} FROM {quote(target_table)} '
+        f'WHERE {quote(target_pk)} IN ({placeholders}) '
+        f'ON CONFLICT ({quote(owner)}, {quote(target)}) DO NOTHING '
+        f'RETURNING {quote(target)}'
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, *target_ids])
+        created = {row[0] for row in cursor.fetchall()}
+        update_counters(model, created, 1)
+        score_links(model, created)
+    return created
+
+
+def remove_links(model, user_id, target_ids):
+    """
+    Удаляет связи пользователя с target_ids одним DELETE ... RETURNING и
+    возвращает множество id, связи с которыми действительно были.
+    """
+
+    target_ids = list(target_ids)
+    if not target_ids:
+        return set()
+    owner, target, _, _ = columns(model)
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    sql = (
+        f'DELETE FROM {quote(model._meta.db_table)} '
+        f'WHERE {quote(owner)} = %s AND {quote(target)} IN ({placeholders}) '
+        f'RETURNING {quote(target)}'
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, *target_ids])
+        removed = {row[0] for row in cursor.fetchall()}
+        update_counters(model, removed, -1)
+    return removed
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.feed import fill_timelines
+from recipes.models import TimelineEntry
+from users.models import Follow
+
+
+class Command(BaseCommand):
+    help = (
+        'fill the followed-authors feed timelines from existing follows, '
+        'skipping authors whose recipes are pulled at read time'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--per-author', type=int, default=settings.FEED_FOLLOW_BACKFILL,
+            help='latest recipes of each followed author to add'
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='delete all timeline entries first'
+        )
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            TimelineEntry.objects.all().delete()
+        follows = Follow.objects.order_by('id').values_list(
+            'id', 'user_id', 'author_id'
+        )
+        last_id = 0
+        total = 0
+        while True:
+            batch = list(follows.filter(id__gt=last_id)[
+                :options['batch_size']
+            ])
+            if not batch:
+                break
+            total += fill_timelines(
+                ((user_id, author_id) for _, user_id, author_id in batch),
+                options['per_author'],
+            )
+            last_id = batch[-1][0]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} timeline entries added or already present'
+        ))
@@ -0,0 +1,159 @@
+import csv
+from io import StringIO
+import json
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from recipes.models import Ingredient
+
+
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+
+
+class Command(BaseCommand):
+    help = (
+        'benchmark import_ingredients on a generated catalogue: first '
+        'import, repeated import, --sync with replaced rows, and the old '
+        'per-row get_or_create'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', type=int, default=1_000_000,
+            help='number of rows in the generated catalogue'
+        )
+        parser.add_argument(
+            '--replaced', type=float, default=0.1,
+            help='share of rows replaced before the --sync import'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--baseline-rows', type=int, default=10_000,
+            help='rows imported with per-row get_or_create for comparison'
+        )
+        parser.add_argument('--output', help='json results file')
+
+    def write_catalogue(self, path, numbers, file_format):
+        rows = (
+            (f'ингредиент {number}', UNITS[number % len(UNITS)])
+            for number in numbers
+        )
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            if file_format == 'csv':
+                csv.writer(file).writerows(rows)
+            else:
+                for name, unit in rows:
+                    file.write(json.dumps(
+                        {'name': name, 'measurement_unit': unit},
+                        ensure_ascii=False,
+                    ) + '\n')
+
+    def run_import(self, label, path, rows, batch_size, sync=False,
+                   flush=False):
+        if flush:
+            call_command('flush', interactive=False, verbosity=0)
+        output = StringIO()
+        started = time.perf_counter()
+        call_command(
+            'import_ingredients', str(path), batch_size=batch_size,
+            sync=sync, stdout=output,
+        )
+        elapsed = time.perf_counter() - started
+        return {
+            'label': label,
+            'rows': rows,
+            'time_s': round(elapsed, 3),
+            'rows_per_s': round(rows / elapsed),
+            'table_rows': Ingredient.objects.count(),
+            'summary': output.getvalue().strip(),
+        }
+
+    def run_baseline(self, rows):
+        """Прежний импорт: get_or_create на каждую строку."""
+
+        call_command('flush', interactive=False, verbosity=0)
+        started = time.perf_counter()
+        for number in range(rows):
+            Ingredient.objects.get_or_create(
+                name=f'ингредиент {number}',
+                measurement_unit=UNITS[number % len(UNITS)],
+            )
+        elapsed = time.perf_counter() - started
+        return {
+            'label': 'per-row get_or_create',
+            'rows': rows,
+            'time_s': round(elapsed, 3),
+            'rows_per_s': round(rows / elapsed),
+            'table_rows': Ingredient.objects.count(),
+            'summary': '',
+        }
+
+    def benchmark(self, options, directory):
+        size = options['size']
+        batch_size = options['batch_size']
+        step = round(1 / options['replaced']) if options['replaced'] else 0
+        csv_path = directory / 'catalogue.csv'
+        ndjson_path = directory / 'catalogue.ndjson'
+        sync_path = directory / 'replaced.csv'
+        self.write_catalogue(csv_path, range(size), 'csv')
+        self.write_catalogue(ndjson_path, range(size), 'ndjson')
+        # Каждая step-я строка заменена новой: --sync удалит старые и
+        # создаст столько же новых.
+        self.write_catalogue(sync_path, (
+            number + size if step and number % step == 0 else number
+            for number in range(size)
+        ), 'csv')
+
+        runs = (
+            ('first import, ndjson', ndjson_path, False, True),
+            ('first import, csv', csv_path, False, True),
+            ('repeated import, csv', csv_path, False, False),
+            ('sync, replaced rows', sync_path, True, False),
+        )
+        results = []
+        for label, path, sync, flush in runs:
+            result = self.run_import(
+                label, path, size, batch_size, sync=sync, flush=flush
+            )
+            results.append(result)
+            self.stderr.write(
+                f'{label:<22} {result["time_s"]:>8.1f}s '
+                f'{result["rows_per_s"]:>8} rows/s '
+                f'{result["table_rows"]:>8} in table'
+            )
+        if options['baseline_rows']:
+            result = self.run_baseline(options['baseline_rows'])
+            results.append(result)
+            self.stderr.write(
+                f'{result["label"]:<22} {result["time_s"]:>8.1f}s '
+                f'{result["rows_per_s"]:>8} rows/s '
+                f'{result["rows"]:>8} rows'
+            )
+        return results
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        caches = {'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }}
+        try:
+            with override_settings(CACHES=caches), \
+                    tempfile.TemporaryDirectory() as directory:
+                results = self.benchmark(options, Path(directory))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        else:
+            json.dump(results, sys.stdout, ensure_ascii=False, indent=2)
+            sys.stdout.write('\n')
@@ -0,0 +1,69 @@
+from collections import defaultdict
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+
+from recipes.importers import batches
+from recipes.models import IngredientsInRecipe, Recipe, TagsInRecipe
+
+
+class Command(BaseCommand):
+    help = 'export recipes with tags and ingredients as ndjson'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', help='output file, stdout by default'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def export(self, output, batch_size):
+        recipes = Recipe.objects.order_by('id').values(
+            'id', 'name', 'text', 'cooking_time', 'pub_date', 'image',
+            'author__email', 'author__username',
+        ).iterator(chunk_size=batch_size)
+        total = 0
+        for batch in batches(recipes, batch_size):
+            ids = [recipe['id'] for recipe in batch]
+            tags = defaultdict(list)
+            for recipe_id, slug in TagsInRecipe.objects.filter(
+                recipe_id__in=ids
+            ).values_list('recipe_id', 'tag__slug'):
+                tags[recipe_id].append(slug)
+            ingredients = defaultdict(list)
+            for recipe_id, name, unit, amount in (
+                IngredientsInRecipe.objects.filter(
+                    recipe_id__in=ids
+                ).values_list(
+                    'recipe_id', 'ingredient__name',
+                    'ingredient__measurement_unit', 'amount'
+                )
+            ):
+                ingredients[recipe_id].append({
+                    'name': name, 'measurement_unit': unit, 'amount': amount
+                })
+
+            for recipe in batch:
+                output.write(json.dumps({
+                    'name': recipe['name'],
+                    'text': recipe['text'],
+                    'cooking_time': recipe['cooking_time'],
+                    'pub_date': recipe['pub_date'].isoformat(),
+                    'image': recipe['image'],
+                    'author': {
+                        'email': recipe['author__email'],
+                        'username': recipe['author__username'],
+                    },
+                    'tags': tags[recipe['id']],
+                    'ingredients': ingredients[recipe['id']],
+                }, ensure_ascii=False) + '\n')
+            total += len(batch)
+        return total
+
+    def handle(self, *args, **options):
+        if options['path']:
+            with open(options['path'], 'w', encoding='utf-8') as output:
+                total = self.export(output, options['batch_size'])
+        else:
+            total = self.export(sys.stdout, options['batch_size'])
+        self.stderr.write(self.style.SUCCESS(f'{total} recipes exported'))
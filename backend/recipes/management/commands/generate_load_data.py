@@ -0,0 +1,288 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+import random
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.cache import bump_version
+from recipes.journal import journal_all
+from recipes.models import (
+    FavoriteRecipe, Ingredient, IngredientsInRecipe, Recipe, ShoppingList, Tag,
+    TagsInRecipe,
+)
+from users.models import Follow, User
+
+
+PLACEHOLDER_IMAGE = 'recipes/images/load.png'
+PUB_DATE_START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+# bulk_update собирает CASE по всем строкам пачки; на длинных CASE база
+# тратит заметно больше времени, чем на несколько коротких запросов.
+PUB_DATE_BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'generate reproducible synthetic users, recipes, favorites, carts '
+        'and follows for load testing'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10_000)
+        parser.add_argument('--favorites', type=int, default=50_000)
+        parser.add_argument('--carts', type=int, default=20_000)
+        parser.add_argument('--follows', type=int, default=10_000)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, nargs=2, default=(3, 12),
+            metavar=('MIN', 'MAX')
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='exponent of the Zipf popularity of authors and recipes'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='parallel batches; forced to 1 on SQLite'
+        )
+        parser.add_argument(
+            '--index', action='store_true',
+            help='rebuild the full-text search index afterwards'
+        )
+
+    def zipf_weights(self, size):
+        return list(accumulate(
+            1 / rank ** self.zipf for rank in range(1, size + 1)
+        ))
+
+    def run_batches(self, total, work):
+        """Вызывает work(start) для каждой пачки, в потоках при workers > 1."""
+
+        def run(start):
+            try:
+                work(start)
+            finally:
+                if self.workers > 1:
+                    connection.close()
+
+        starts = range(0, total, self.batch_size)
+        if self.workers > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                list(executor.map(run, starts))
+        else:
+            for start in starts:
+                run(start)
+
+    def generate(self, label, total, build, model, ignore_conflicts=False):
+        """
+        Создаёт total объектов пачками. У каждой пачки свой генератор
+        случайных чисел, зависящий только от seed, вида данных и номера
+        пачки, поэтому результат не зависит от числа потоков.
+        """
+
+        started = time.monotonic()
+
+        def work(start):
+            rng = random.Random(f'{self.seed}:{label}:{start}')
+            size = min(self.batch_size, total - start)
+            model.objects.bulk_create(
+                build(rng, start, size),
+                batch_size=self.batch_size,
+                ignore_conflicts=ignore_conflicts,
+            )
+
+        self.run_batches(total, work)
+        self.stdout.write(
+            f'{label}: {total} generated in '
+            f'{time.monotonic() - started:.1f}s'
+        )
+
+    def ids_by_number(self, model, field, prefix):
+        """
+        id созданных строк, упорядоченные по номеру из значения field.
+        Пачки из нескольких потоков вставляются в произвольном порядке,
+        поэтому порядок id от запуска к запуску меняется, а номер — нет.
+        """
+
+        ids = {
+            int(value[len(prefix):]): pk
+            for value, pk in model.objects.filter(
+                **{f'{field}__startswith': prefix}
+            ).values_list(field, 'id').iterator()
+        }
+        return [ids[number] for number in sorted(ids)]
+
+    def pub_date(self, number):
+        """
+        Дата публикации рецепта number. pub_date заполняется при вставке
+        текущим временем, и порядок по ней зависел бы от потоков; здесь
+        она зависит только от номера, а микросекунды от seed разводят
+        наборы с разными seed.
+        """
+
+        return PUB_DATE_START + timedelta(
+            minutes=number, microseconds=self.seed % 1_000_000
+        )
+
+    def generate_users(self, prefix, total):
+        def build(rng, start, size):
+            for number in range(start, start + size):
+                yield User(
+                    username=f'{prefix}{number}',
+                    email=f'{prefix}{number}@example.com',
+                    first_name='Load',
+                    last_name=f'User {number}',
+                    password='!',
+                )
+
+        self.generate('users', total, build, User)
+        return self.ids_by_number(User, 'username', prefix)
+
+    def generate_recipes(self, prefix, total, user_ids):
+        user_weights = self.zipf_weights(len(user_ids))
+
+        def build(rng, start, size):
+            authors = rng.choices(user_ids, cum_weights=user_weights, k=size)
+            for number, author_id in zip(range(start, start + size), authors):
+                yield Recipe(
+                    author_id=author_id,
+                    name=f'{prefix}recipe {number}',
+                    text=f'Load test recipe {number}',
+                    cooking_time=rng.randint(5, 180),
+                    image=PLACEHOLDER_IMAGE,
+                )
+
+        self.generate('recipes', total, build, Recipe)
+        recipe_ids = self.ids_by_number(Recipe, 'name', f'{prefix}recipe ')
+
+        def set_pub_dates(start):
+            Recipe.objects.bulk_update(
+                (
+                    Recipe(id=pk, pub_date=self.pub_date(number))
+                    for number, pk in enumerate(
+                        recipe_ids[start:start + self.batch_size], start
+                    )
+                ),
+                ('pub_date',), batch_size=PUB_DATE_BATCH_SIZE,
+            )
+
+        self.run_batches(len(recipe_ids), set_pub_dates)
+        return recipe_ids
+
+    def generate_recipe_contents(self, recipe_ids, tag_ids, ingredient_ids,
+                                 per_recipe):
+        low, high = per_recipe
+        high = min(high, len(ingredient_ids))
+        low = min(low, high)
+
+        def build_tags(rng, start, size):
+            for recipe_id in recipe_ids[start:start + size]:
+                for tag_id in rng.sample(
+                    tag_ids, rng.randint(1, len(tag_ids))
+                ):
+                    yield TagsInRecipe(recipe_id=recipe_id, tag_id=tag_id)
+
+        def build_ingredients(rng, start, size):
+            for recipe_id in recipe_ids[start:start + size]:
+                for ingredient_id in rng.sample(
+                    ingredient_ids, rng.randint(low, high)
+                ):
+                    yield IngredientsInRecipe(
+                        recipe_id=recipe_id,
+                        ingredient_id=ingredient_id,
+                        amount=rng.randint(1, 500),
+                    )
+
+        self.generate(
+            'recipe tags', len(recipe_ids), build_tags, TagsInRecipe
+        )
+        self.generate(
+            'recipe ingredients', len(recipe_ids), build_ingredients,
+            IngredientsInRecipe
+        )
+
+    def generate_activity(self, options, user_ids, recipe_ids):
+        """Избранное, корзины и подписки с популярностью по Ципфу."""
+
+        user_weights = self.zipf_weights(len(user_ids))
+        recipe_weights = self.zipf_weights(len(recipe_ids))
+
+        def build_popular_recipes(model):
+            def build(rng, start, size):
+                for user_id, recipe_id in zip(
+                    rng.choices(user_ids, k=size),
+                    rng.choices(
+                        recipe_ids, cum_weights=recipe_weights, k=size
+                    ),
+                ):
+                    yield model(user_id=user_id, recipe_id=recipe_id)
+            return build
+
+        def build_follows(rng, start, size):
+            for user_id, author_id in zip(
+                rng.choices(user_ids, k=size),
+                rng.choices(user_ids, cum_weights=user_weights, k=size),
+            ):
+                if user_id != author_id:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        self.generate(
+            'favorites', options['favorites'],
+            build_popular_recipes(FavoriteRecipe), FavoriteRecipe,
+            ignore_conflicts=True
+        )
+        self.generate(
+            'shopping carts', options['carts'],
+            build_popular_recipes(ShoppingList), ShoppingList,
+            ignore_conflicts=True
+        )
+        self.generate(
+            'follows', options['follows'], build_follows, Follow,
+            ignore_conflicts=True
+        )
+
+    def handle(self, *args, **options):
+        self.seed = options['seed']
+        self.zipf = options['zipf']
+        self.batch_size = options['batch_size']
+        self.workers = options['workers']
+        if connection.vendor == 'sqlite':
+            self.workers = 1
+        prefix = f'load{self.seed}_'
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f'Load data for seed {self.seed} already exists'
+            )
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        tag_ids = list(Tag.objects.order_by('id').values_list('id', flat=True))
+        if not ingredient_ids or not tag_ids:
+            raise CommandError('Import ingredients and tags first')
+
+        user_ids = self.generate_users(prefix, options['users'])
+        recipe_ids = self.generate_recipes(
+            prefix, options['recipes'], user_ids
+        )
+        self.generate_recipe_contents(
+            recipe_ids, tag_ids, ingredient_ids,
+            options['ingredients_per_recipe'],
+        )
+        self.generate_activity(options, user_ids, recipe_ids)
+
+        call_command('recount', batch_size=self.batch_size, stdout=self.stdout)
+        if options['index']:
+            call_command(
+                'rebuild_search_index', batch_size=self.batch_size,
+                stdout=self.stdout
+            )
+        bump_version('recipes')
+        journal_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Load data generated with seed {self.seed}'
+        ))
@@ -1,38 +1,12 @@
-import csv
-
-from django.conf import settings
-from django.core.management.base import BaseCommand
-
+from recipes.importers import ImportCommand
 from recipes.models import Ingredient
 
 
-PATH = '../data/'
-
-
-class Command(BaseCommand):
-    help = 'import data from ingredients.csv'
-
-    def handle(self, *args, **kwargs):
-        with open(f'{settings.BASE_DIR}/data/ingredients.csv', 'r',) as file:
-            reader = csv.reader(file)
-
-            for row in reader:
-                print(row)
-
-                ingredient, created = Ingredient.objects.get_or_create(
-                    name=row[0],
-                    measurement_unit=row[1],
-                )
-
-                if created:
-                    self.stdout.write(self.style.SUCCESS(
-                        f'Ingredient {ingredient.name} created'
-                    ))
-                else:
-                    self.stdout.write(self.style.WARNING(
-                        f'Ingredient {ingredient.name} already exists'
-                    ))
+class Command(ImportCommand):
+    help = 'import ingredients from a csv, json or ndjson file'
 
-            self.stdout.write(self.style.SUCCESS(
-                f'Data from {file.name} imported successfully'
-            ))
+    model = Ingredient
+    key_fields = ('name', 'measurement_unit')
+    fields = ('name', 'measurement_unit')
+    default_path = 'data/ingredients.csv'
+    protected_relation = 'ingredient'
@@ -0,0 +1,137 @@
+from collections import Counter
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db.transaction import atomic
+from django.utils.dateparse import parse_datetime
+
+from api.cache import bump_version
+from recipes.counters import update_counter
+from recipes.importers import MAX_REPORTED_ERRORS, batches, read_rows
+from recipes.journal import journal_all
+from recipes.models import (
+    Ingredient, IngredientsInRecipe, Recipe, Tag, TagsInRecipe,
+)
+from recipes.search import index_recipes
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'import recipes exported by export_recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def read(self, path, stats, errors):
+        """Строки файла; нечитаемые пропускаются и попадают в сводку."""
+
+        for number, row in enumerate(read_rows(path, 'ndjson', ()), 1):
+            if isinstance(row, ValidationError):
+                stats['invalid'] += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append(f'row {number}: {row}')
+                continue
+            yield row
+
+    @atomic
+    def import_batch(self, batch, stats):
+        names = {row['name'] for row in batch}
+        existing = set(Recipe.objects.filter(
+            name__in=names
+        ).values_list('name', flat=True))
+        authors = dict(User.objects.filter(
+            email__in={row['author']['email'] for row in batch}
+        ).values_list('email', 'id'))
+        tags = dict(Tag.objects.filter(
+            slug__in={slug for row in batch for slug in row['tags']}
+        ).values_list('slug', 'id'))
+        ingredients = {
+            (name, unit): pk
+            for pk, name, unit in Ingredient.objects.filter(
+                name__in={
+                    item['name'] for row in batch
+                    for item in row['ingredients']
+                }
+            ).values_list('id', 'name', 'measurement_unit')
+        }
+
+        rows = []
+        for row in batch:
+            if row['name'] in existing:
+                stats['existing'] += 1
+            elif row['author']['email'] not in authors:
+                stats['unknown author'] += 1
+            else:
+                existing.add(row['name'])
+                rows.append(row)
+        Recipe.objects.bulk_create(
+            Recipe(
+                name=row['name'],
+                text=row['text'],
+                cooking_time=row['cooking_time'],
+                image=row['image'],
+                author_id=authors[row['author']['email']],
+            )
+            for row in rows
+        )
+        recipes = Recipe.objects.filter(
+            name__in=[row['name'] for row in rows]
+        ).only('id', 'name', 'text', 'pub_date')
+        recipes = {recipe.name: recipe for recipe in recipes}
+
+        links_tags = []
+        links_ingredients = []
+        for row in rows:
+            recipe = recipes[row['name']]
+            recipe.pub_date = parse_datetime(row['pub_date'])
+            for slug in row['tags']:
+                if slug in tags:
+                    links_tags.append(
+                        TagsInRecipe(recipe=recipe, tag_id=tags[slug])
+                    )
+                else:
+                    stats['unknown tag'] += 1
+            for item in row['ingredients']:
+                key = (item['name'], item['measurement_unit'])
+                if key in ingredients:
+                    links_ingredients.append(IngredientsInRecipe(
+                        recipe=recipe,
+                        ingredient_id=ingredients[key],
+                        amount=item['amount'],
+                    ))
+                else:
+                    stats['unknown ingredient'] += 1
+
+        Recipe.objects.bulk_update(recipes.values(), ('pub_date',))
+        TagsInRecipe.objects.bulk_create(links_tags)
+        IngredientsInRecipe.objects.bulk_create(links_ingredients)
+        index_recipes(list(recipes.values()))
+        for author_id, count in Counter(
+            authors[row['author']['email']] for row in rows
+        ).items():
+            update_counter(User, [author_id], 'recipes_count', count)
+        stats['created'] += len(rows)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        stats = Counter()
+        errors = []
+        rows = self.read(options['path'], stats, errors)
+        for batch in batches(rows, options['batch_size']):
+            self.import_batch(batch, stats)
+        bump_version('recipes')
+        journal_all()
+
+        for error in errors:
+            self.stderr.write(self.style.WARNING(f'Invalid {error}'))
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{stats["created"]} recipes imported in {elapsed:.2f}s; '
+            f'{stats["invalid"]} invalid, '
+            f'{stats["existing"]} already existed, '
+            f'{stats["unknown author"]} skipped for unknown author, '
+            f'{stats["unknown tag"]} unknown tags and '
+            f'{stats["unknown ingredient"]} unknown ingredients dropped'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db.transaction import atomic
+
+from recipes.models import Recipe
+from recipes.search import index_recipes
+
+
+class Command(BaseCommand):
+    help = 'rebuild full-text search index for recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        recipes = Recipe.objects.only('id', 'name', 'text').order_by('id')
+        last_id = 0
+        total = 0
+        while True:
+            batch = list(recipes.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with atomic():
+                index_recipes(batch)
+            last_id = batch[-1].id
+            total += len(batch)
+            self.stdout.write(f'Indexed {total} recipes')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Search index rebuilt for {total} recipes'
+        ))
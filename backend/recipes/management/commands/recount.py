@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import COUNTERS, recount
+
+
+class Command(BaseCommand):
+    help = 'repair denormalized favorite, cart, recipe and follower counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model, field, related_model, related_field in COUNTERS:
+            ids = model.objects.order_by('id').values_list('id', flat=True)
+            last_id = 0
+            fixed = 0
+            while True:
+                batch = list(ids.filter(id__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+                fixed += recount(
+                    model, field, related_model, related_field, batch
+                )
+                last_id = batch[-1]
+
+            self.stdout.write(self.style.SUCCESS(
+                f'{model.__name__}.{field}: {fixed} rows repaired'
+            ))
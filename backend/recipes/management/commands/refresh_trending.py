@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from recipes.models import Recipe, RecipeScore
+
+
+class Command(BaseCommand):
+    help = (
+        'decay trending scores by the time elapsed since the previous run '
+        'and drop the ones that faded out; run it periodically'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='replace the scores with ones derived from the current '
+                 'favorite and cart counters'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def rebuild(self, batch_size):
+        RecipeScore.objects.all().delete()
+        recipes = Recipe.objects.exclude(
+            favorites_count=0, in_carts_count=0
+        ).order_by('id')
+        last_id = 0
+        while True:
+            batch = list(recipes.filter(id__gt=last_id).values_list(
+                'id', 'favorites_count', 'in_carts_count'
+            )[:batch_size])
+            if not batch:
+                break
+            RecipeScore.objects.bulk_create(
+                RecipeScore(
+                    recipe_id=pk,
+                    score=favorites * settings.TRENDING_FAVORITE_WEIGHT
+                    + carts * settings.TRENDING_CART_WEIGHT,
+                )
+                for pk, favorites, carts in batch
+            )
+            last_id = batch[-1][0]
+
+    def decay(self):
+        """
+        Умножает все рейтинги на 0.5 ** (прошедшее время / период
+        полураспада). Все строки затухают одним UPDATE, поэтому время
+        прошлого запуска — наибольшее decayed_at; строки, созданные
+        после него, затухают так, будто созданы при прошлом запуске.
+        """
+
+        now = timezone.now()
+        last = RecipeScore.objects.aggregate(
+            last=Max('decayed_at')
+        )['last']
+        factor = 1.0
+        if last is not None:
+            elapsed = max((now - last).total_seconds(), 0)
+            factor = 0.5 ** (
+                elapsed / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+            )
+        updated = RecipeScore.objects.update(
+            score=F('score') * factor, decayed_at=now
+        )
+        removed, _ = RecipeScore.objects.filter(
+            score__lt=settings.TRENDING_MIN_SCORE
+        ).delete()
+        return factor, updated, removed
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['rebuild']:
+                self.rebuild(options['batch_size'])
+            factor, updated, removed = self.decay()
+        self.stdout.write(self.style.SUCCESS(
+            f'{updated} scores decayed by {factor:.4f}, {removed} removed'
+        ))
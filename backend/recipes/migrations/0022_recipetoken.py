@@ -0,0 +1,31 @@
+# Generated by Django 3.2 on 2026-10-18 20:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0021_alter_ingredientsinrecipe_amount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, verbose_name='токен')),
+                ('hits', models.PositiveIntegerField(verbose_name='вхождения')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='recipes.recipe', verbose_name='рецепт')),
+            ],
+            options={
+                'verbose_name': 'Поисковый индекс',
+                'verbose_name_plural': 'Поисковый индекс',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recipetoken',
+            constraint=models.UniqueConstraint(fields=('token', 'recipe'), name='unique_token_recipe'),
+        ),
+    ]
@@ -3,7 +3,7 @@ from django.core.validators import (
 )
 from django.db import models
 
-from users.models import User
+from users.models import CounterFieldsMixin, User
 
 
 class Ingredient(models.Model):
@@ -62,7 +62,7 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(CounterFieldsMixin, models.Model):
     """Модель рецептов"""
 
     author = models.ForeignKey(
@@ -102,11 +102,28 @@ class Recipe(models.Model):
         ]
     )
     pub_date = models.DateTimeField('дата публикации', auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        'число добавлений в избранное', default=0, editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'число добавлений в список покупок', default=0, editable=False
+    )
+
+    counter_fields = ('favorites_count', 'in_carts_count')
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'), name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx',
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -172,6 +189,35 @@ class IngredientsInRecipe(models.Model):
         )
 
 
+class RecipeToken(models.Model):
+    """
+    Модель поискового индекса: токен из названия или описания рецепта и
+    число его вхождений с учётом веса названия
+    """
+
+    token = models.CharField('токен', max_length=64)
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='search_tokens',
+        verbose_name='рецепт'
+    )
+    hits = models.PositiveIntegerField('вхождения')
+
+    class Meta:
+        verbose_name = 'Поисковый индекс'
+        verbose_name_plural = 'Поисковый индекс'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('token', 'recipe'),
+                name='unique_token_recipe'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.token} in {self.recipe}'
+
+
 class FavoriteRecipe(models.Model):
     """Модель для рецептов в избранном"""
 
@@ -230,3 +276,100 @@ class ShoppingList(models.Model):
 
     def __str__(self):
         return f'{self.user} added {self.recipe} to shopping list'
+
+
+class TimelineEntry(models.Model):
+    """
+    Модель ленты подписок: рецепт автора, на которого подписан
+    пользователь. Дата публикации копируется из рецепта, чтобы лента
+    листалась по индексу без соединения с рецептами
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='владелец ленты'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='рецепт в ленте'
+    )
+    pub_date = models.DateTimeField('дата публикации рецепта')
+
+    class Meta:
+        verbose_name = 'Лента подписок'
+        verbose_name_plural = 'Лента подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_timeline_entry',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='timeline_user_pub_date_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} in {self.user} feed'
+
+
+class RecipeScore(models.Model):
+    """
+    Модель рейтинга «популярное сейчас»: сумма весов добавлений в
+    избранное, в список покупок и просмотров рецепта, затухающая со
+    временем. Затухание применяет периодическая команда refresh_trending
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='рецепт'
+    )
+    score = models.FloatField('рейтинг', default=0)
+    decayed_at = models.DateTimeField(
+        'время последнего затухания', null=True, blank=True
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинг рецептов'
+        indexes = (
+            models.Index(
+                fields=('-score', '-recipe'), name='recipe_score_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe}: {self.score:.2f}'
+
+
+class RecipeChange(models.Model):
+    """
+    Модель журнала изменений состава рецептов. По возрастающему id
+    процессные индексы догоняют базу без полной перестройки. Рецепт
+    хранится числом, а не внешним ключом, чтобы запись об удалении
+    пережила рецепт; пустой рецепт означает изменение всех рецептов
+    """
+
+    recipe_id = models.PositiveIntegerField('id рецепта', null=True)
+    created = models.DateTimeField('время изменения', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Изменение рецепта'
+        verbose_name_plural = 'Журнал изменений рецептов'
+        indexes = (
+            models.Index(
+                fields=('created',), name='recipe_change_created_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.id}: {self.recipe_id}'
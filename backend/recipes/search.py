@@ -0,0 +1,38 @@
+from collections import Counter
+import re
+
+from .models import RecipeToken
+
+
+TOKEN_RE = re.compile(r'\w{2,}')
+MAX_TOKEN_LENGTH = RecipeToken._meta.get_field('token').max_length
+NAME_WEIGHT = 5
+
+
+def tokenize(text):
+    """Разбивает текст на токены поискового индекса."""
+
+    return [
+        token[:MAX_TOKEN_LENGTH]
+        for token in TOKEN_RE.findall(text.casefold())
+    ]
+
+
+def recipe_tokens(recipe):
+    hits = Counter(tokenize(recipe.text))
+    for token in tokenize(recipe.name):
+        hits[token] += NAME_WEIGHT
+    return hits
+
+
+def index_recipes(recipes):
+    """Перестраивает записи поискового индекса для переданных рецептов."""
+
+    RecipeToken.objects.filter(
+        recipe_id__in=[recipe.id for recipe in recipes]
+    ).delete()
+    RecipeToken.objects.bulk_create(
+        RecipeToken(recipe_id=recipe.id, token=token, hits=hits)
+        for recipe in recipes
+        for token, hits in recipe_tokens(recipe).items()
+    )
@@ -0,0 +1,88 @@
+from django.core.signals import request_finished
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .counters import mark_deleted, update_counter, update_counter_on_commit
+from .models import FavoriteRecipe, Recipe, ShoppingList
+from .search import index_recipes
+from .tasks import fan_out_recipe
+from .trending import score_links, view_buffer
+from users.models import Follow, User
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not {'name', 'text'} & set(update_fields):
+        return
+    index_recipes([instance])
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        update_counter(User, [instance.author_id], 'recipes_count', 1)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_new_recipe(sender, instance, created, **kwargs):
+    if created:
+        fan_out_recipe.enqueue(recipe_id=instance.id)
+
+
+@receiver(pre_delete, sender=Recipe)
+@receiver(pre_delete, sender=User)
+def skip_deleted_counters(sender, instance, **kwargs):
+    mark_deleted(sender, instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    update_counter_on_commit(
+        User, [instance.author_id], 'recipes_count', -1
+    )
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        update_counter(Recipe, [instance.recipe_id], 'favorites_count', 1)
+        score_links(sender, [instance.recipe_id])
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+def decrement_favorites_count(sender, instance, **kwargs):
+    update_counter_on_commit(
+        Recipe, [instance.recipe_id], 'favorites_count', -1
+    )
+
+
+@receiver(post_save, sender=ShoppingList)
+def increment_in_carts_count(sender, instance, created, **kwargs):
+    if created:
+        update_counter(Recipe, [instance.recipe_id], 'in_carts_count', 1)
+        score_links(sender, [instance.recipe_id])
+
+
+@receiver(post_delete, sender=ShoppingList)
+def decrement_in_carts_count(sender, instance, **kwargs):
+    update_counter_on_commit(
+        Recipe, [instance.recipe_id], 'in_carts_count', -1
+    )
+
+
+@receiver(post_save, sender=Follow)
+def increment_followers_count(sender, instance, created, **kwargs):
+    if created:
+        update_counter(User, [instance.author_id], 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_followers_count(sender, instance, **kwargs):
+    update_counter_on_commit(
+        User, [instance.author_id], 'followers_count', -1
+    )
+
+
+@receiver(request_finished)
+def flush_recipe_views(sender, **kwargs):
+    view_buffer.maybe_flush()
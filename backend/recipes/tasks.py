@@ -0,0 +1,105 @@
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .feed import fill_timelines
+from .models import Recipe, TimelineEntry
+from api.cache import bump_version_on_commit
+from jobs.queue import task
+from users.models import Follow
+
+
+EXIF_ORIENTATION = 0x0112
+
+
+@task
+def process_recipe_image(recipe_id):
+    """
+    Поворачивает изображение рецепта по EXIF и уменьшает его до
+    RECIPE_IMAGE_MAX_SIZE по большей стороне. Изображение без поворота и
+    не больше предела не перекодируется. Ссылка на файл меняется только
+    если за время обработки рецепту не загрузили новое изображение.
+    """
+
+    recipe = Recipe.objects.filter(id=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+    max_size = settings.RECIPE_IMAGE_MAX_SIZE
+    with recipe.image.open() as file:
+        image = Image.open(file)
+        image_format = image.format
+        rotated = image.getexif().get(EXIF_ORIENTATION, 1) != 1
+        if not rotated and max(image.size) <= max_size:
+            return
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size))
+        buffer = BytesIO()
+        image.save(buffer, format=image_format)
+
+    old_name = recipe.image.name
+    storage = recipe.image.storage
+    new_name = storage.save(
+        recipe.image.field.generate_filename(
+            recipe, old_name.rsplit('/', 1)[-1]
+        ),
+        ContentFile(buffer.getvalue()),
+    )
+    if Recipe.objects.filter(id=recipe_id, image=old_name).update(
+        image=new_name
+    ):
+        bump_version_on_commit('recipes')
+        storage.delete(old_name)
+    else:
+        storage.delete(new_name)
+
+
+@task
+def delete_recipe_image(name):
+    default_storage.delete(name)
+
+
+@task
+def fan_out_recipe(recipe_id, after=0):
+    """
+    Раскладывает новый рецепт в ленты подписчиков автора пачкой по
+    FEED_FANOUT_BATCH_SIZE подписчиков; следующая пачка ставится в
+    очередь отдельной задачей, поэтому повтор после ошибки не начинает
+    раздачу сначала. Рецепты популярных авторов не раскладываются.
+    """
+
+    recipe = Recipe.objects.select_related('author').filter(
+        id=recipe_id
+    ).first()
+    if (
+        recipe is None
+        or recipe.author.followers_count >= settings.FEED_PULL_THRESHOLD
+    ):
+        return
+    batch_size = settings.FEED_FANOUT_BATCH_SIZE
+    followers = list(Follow.objects.filter(
+        author_id=recipe.author_id, user_id__gt=after
+    ).order_by('user_id').values_list('user_id', flat=True)[:batch_size])
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id, recipe_id=recipe.id, pub_date=recipe.pub_date
+            )
+            for user_id in followers
+        ),
+        ignore_conflicts=True,
+    )
+    if len(followers) == batch_size:
+        fan_out_recipe.enqueue(recipe_id=recipe_id, after=followers[-1])
+
+
+@task
+def fill_timeline(user_id, author_id):
+    """Добавляет в ленту последние рецепты автора после подписки."""
+
+    if Follow.objects.filter(user_id=user_id, author_id=author_id).exists():
+        fill_timelines(
+            ((user_id, author_id),), settings.FEED_FOLLOW_BACKFILL
+        )
@@ -0,0 +1,36 @@
+from weakref import WeakValueDictionary
+
+from django.db import transaction
+
+
+def on_commit_once(key, factory):
+    """
+    Обработчик key, отложенный до фиксации транзакции на текущем уровне
+    точек сохранения: при первом вызове он создаётся через factory() и
+    регистрируется в transaction.on_commit, дальше возвращается тот же.
+
+    Соединение хранит обработчики по слабым ссылкам, сильная ссылка есть
+    только у Django в очереди on_commit. При фиксации обработчик сам
+    убирает себя из словаря, а при откате транзакции или точки
+    сохранения Django выбрасывает его из очереди, и запись исчезает
+    вместе с ним. Следующий вызов заводит новый обработчик.
+    """
+
+    connection = transaction.get_connection()
+    pending = connection.__dict__.setdefault(
+        'pending_on_commit', WeakValueDictionary()
+    )
+    # Блок atomic(savepoint=False) откатывается только вместе с внешним,
+    # поэтому уровнем не считается.
+    level = (key, tuple(sid for sid in connection.savepoint_ids if sid))
+    callback = pending.get(level)
+    if callback is None:
+        callback = pending[level] = factory()
+
+        def run():
+            if pending.get(level) is callback:
+                del pending[level]
+            callback()
+
+        transaction.on_commit(run)
+    return callback
@@ -0,0 +1,93 @@
+from collections import Counter
+from threading import Lock
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .models import FavoriteRecipe, Recipe, RecipeScore, ShoppingList
+
+
+def event_weights():
+    return {
+        FavoriteRecipe: settings.TRENDING_FAVORITE_WEIGHT,
+        ShoppingList: settings.TRENDING_CART_WEIGHT,
+    }
+
+
+def add_scores(recipe_ids, weight):
+    """
+    Прибавляет weight к рейтингу рецептов одним INSERT ... ON CONFLICT DO
+    UPDATE. Несуществующие id отсекает SELECT. Новая строка получает
+    decayed_at NULL: её вес начнёт затухать со следующего обновления.
+    """
+
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids or not weight:
+        return
+    quote = connection.ops.quote_name
+    table = quote(RecipeScore._meta.db_table)
+    recipe = quote(RecipeScore._meta.get_field('recipe').column)
+    score = quote(RecipeScore._meta.get_field('score').column)
+    recipe_pk = quote(Recipe._meta.pk.column)
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    sql = (
+        f'INSERT INTO {table} ({recipe}, {score}) '
+        f'SELECT {recipe_pk}, %s FROM {quote(Recipe._meta.db_table)} '
+        f'WHERE {recipe_pk} IN ({placeholders}) '
+        f'ON CONFLICT ({recipe}) DO UPDATE '
+        f'SET {score} = {table}.{score} + excluded.{score}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [weight, *recipe_ids])
+
+
+def score_links(model, recipe_ids):
+    """Учитывает в рейтинге новые связи избранного и списка покупок."""
+
+    add_scores(recipe_ids, event_weights().get(model, 0))
+
+
+class ViewBuffer:
+    """
+    Процессный счётчик просмотров рецептов. Просмотры копятся в памяти и
+    пишутся в рейтинг не чаще раза в TRENDING_VIEW_FLUSH_INTERVAL секунд
+    по сигналу request_finished, уже после отправки ответа, по одному
+    запросу на каждое различное число просмотров. Сам просмотр рецепта
+    в базу не пишет. Несброшенные просмотры при остановке процесса
+    теряются.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counts = Counter()
+        self.flushed = time.monotonic()
+
+    def add(self, recipe_id):
+        with self._lock:
+            self._counts[recipe_id] += 1
+
+    def maybe_flush(self):
+        interval = settings.TRENDING_VIEW_FLUSH_INTERVAL
+        if time.monotonic() - self.flushed >= interval:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self.flushed = time.monotonic()
+        by_count = {}
+        for recipe_id, count in counts.items():
+            by_count.setdefault(count, []).append(recipe_id)
+        for count, recipe_ids in by_count.items():
+            add_scores(recipe_ids, count * settings.TRENDING_VIEW_WEIGHT)
+
+
+view_buffer = ViewBuffer()
+
+
+def record_view(recipe_id):
+    try:
+        view_buffer.add(int(recipe_id))
+    except (TypeError, ValueError):
+        pass
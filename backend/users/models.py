@@ -3,7 +3,31 @@ from django.core.validators import RegexValidator
 from django.db import models
 
 
-class User(AbstractUser):
+class CounterFieldsMixin:
+    """
+    Исключает счётчики counter_fields из обычного save(): их меняют
+    только атомарные UPDATE, а сохранение всей строки записало бы обратно
+    значения, прочитанные до чужих изменений.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+            and not self._state.adding
+        ):
+            skipped = set(self.counter_fields) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+                and field.name not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
     """Кастомная модель пользователя."""
 
     email = models.EmailField('email адрес', unique=True)
@@ -16,6 +40,14 @@ class User(AbstractUser):
     first_name = models.CharField('имя', max_length=150)
     last_name = models.CharField('фамилия', max_length=150)
     password = models.CharField('пароль', max_length=150)
+    recipes_count = models.PositiveIntegerField(
+        'число рецептов', default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'число подписчиков', default=0, editable=False
+    )
+
+    counter_fields = ('recipes_count', 'followers_count')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'password', 'first_name', 'last_name']